@@ -0,0 +1,16 @@
+"""
+Gunicorn configuration for the mock external API.
+Usage: gunicorn -c gunicorn.conf.py mock_api:app
+
+Note: each worker keeps its own in-memory appointments/tickets, so use
+multiple workers for throughput testing rather than stateful flows.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = (os.cpu_count() or 1) * 2 + 1
+worker_class = "uvicorn.workers.UvicornWorker"
+keepalive = 5
+loglevel = "warning"
+accesslog = None
@@ -4,11 +4,17 @@ Simulates external services like appointment scheduling, CRM, etc.
 """
 
 from fastapi import FastAPI, HTTPException
-from datetime import datetime, timedelta
+from fastapi.responses import ORJSONResponse
+from datetime import date as date_type, datetime, time as time_type, timedelta
+from collections import defaultdict
+from itertools import islice
+import asyncio
+import re
 import uuid
 import random
-from typing import Dict, List, Optional
-from pydantic import BaseModel, EmailStr
+import time
+from typing import Dict, List, Optional, Set
+from pydantic import BaseModel, ConfigDict, field_validator
 import uvicorn
 from loguru import logger
 
@@ -16,7 +22,8 @@ from loguru import logger
 app = FastAPI(
     title="Mock External API",
     description="Mock API simulating external services for Customer Care Chatbot",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # In-memory storage for mock data
@@ -24,15 +31,75 @@ appointments_db = []
 users_db = []
 support_tickets_db = []
 
+# Indexes over the in-memory storage for O(1) lookups
+appointments_by_id: Dict[str, dict] = {}
+cancelled_ids: Set[str] = set()
+tickets_by_status: Dict[str, List[dict]] = defaultdict(list)
+
+# Writes are serialized; list reads page over a tuple snapshot rebuilt only after writes
+_write_lock = asyncio.Lock()
+_appointments_snapshot = {"version": 0, "built_version": -1, "items": ()}
+
+def _appointments_view() -> tuple:
+    """Immutable snapshot of appointments_db, refreshed lazily after writes"""
+    if _appointments_snapshot["built_version"] != _appointments_snapshot["version"]:
+        _appointments_snapshot["items"] = tuple(appointments_db)
+        _appointments_snapshot["built_version"] = _appointments_snapshot["version"]
+    return _appointments_snapshot["items"]
+
+# Monitoring endpoints serve snapshots refreshed at most once per TTL
+SNAPSHOT_TTL_SECONDS = 1.0
+_status_cache = {"value": None, "refreshed_at": 0.0}
+_timestamp_cache = {"value": "", "refreshed_at": 0.0}
+
+def _cached_timestamp() -> str:
+    """Current ISO timestamp at snapshot-TTL granularity"""
+    now = time.monotonic()
+    if now - _timestamp_cache["refreshed_at"] > SNAPSHOT_TTL_SECONDS:
+        _timestamp_cache["value"] = datetime.now().isoformat()
+        _timestamp_cache["refreshed_at"] = now
+    return _timestamp_cache["value"]
+
+def _build_system_status() -> dict:
+    """Generate a fresh mock system status snapshot"""
+    return {
+        "system": {
+            "status": "operational",
+            "version": "1.0.0",
+            "uptime": f"{random.randint(100, 1000)} hours",
+            "load_average": f"{random.uniform(0.1, 2.5):.2f}",
+            "memory_usage_percent": random.randint(30, 80)
+        },
+        "services": {
+            "database": "online",
+            "email_service": "online" if random.random() > 0.1 else "degraded",
+            "payment_gateway": "online" if random.random() > 0.05 else "offline",
+            "sms_service": "online" if random.random() > 0.2 else "maintenance"
+        },
+        "timestamp": _cached_timestamp()
+    }
+
+# Lightweight email shape check (no email-validator/DNS work per request)
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+def _check_email(value: str) -> str:
+    if not EMAIL_PATTERN.match(value):
+        raise ValueError("value is not a valid email address")
+    return value
+
 # Models
 class AppointmentRequest(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+    
     service_type: str
-    date: str
-    time: str
+    date: date_type
+    time: time_type
     customer_name: str
-    email: EmailStr
+    email: str
     phone: Optional[str] = None
     notes: Optional[str] = None
+    
+    _validate_email = field_validator('email')(_check_email)
 
 class AppointmentResponse(BaseModel):
     success: bool
@@ -42,15 +109,21 @@ class AppointmentResponse(BaseModel):
     confirmation_email_sent: bool
 
 class SupportTicketRequest(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+    
     user_id: str
     issue_type: str
     description: str
     priority: str = "medium"
 
 class UserRegistration(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+    
     name: str
-    email: EmailStr
+    email: str
     phone: Optional[str] = None
+    
+    _validate_email = field_validator('email')(_check_email)
 
 @app.get("/")
 async def root():
@@ -83,7 +156,7 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "mock_api",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": _cached_timestamp(),
         "uptime": "24h",  # Mock value
         "database": {
             "appointments": len(appointments_db),
@@ -95,19 +168,21 @@ async def health_check():
 @app.post("/api/appointments", response_model=AppointmentResponse)
 async def schedule_appointment(request: AppointmentRequest):
     """Mock endpoint for scheduling appointments"""
+    now = datetime.now()
+    now_iso = now.isoformat()
+    
     try:
-        # Validate date/time (simplified validation)
-        appointment_date = datetime.strptime(request.date, "%Y-%m-%d")
-        
-        # Check if date is in the past
-        if appointment_date.date() < datetime.now().date():
+        # Check if date is in the past (date/time already parsed by the model)
+        if request.date < now.date():
             raise HTTPException(status_code=400, detail="Cannot schedule appointment in the past")
         
         # Check if time is within business hours (9 AM - 6 PM)
-        hour = int(request.time.split(":")[0])
-        if not 9 <= hour <= 18:
+        if not 9 <= request.time.hour <= 18:
             raise HTTPException(status_code=400, detail="Appointments available 9 AM - 6 PM only")
         
+        date_str = request.date.isoformat()
+        time_str = request.time.strftime("%H:%M")
+        
         # Generate appointment ID
         appointment_id = f"APPT-{uuid.uuid4().hex[:8].upper()}"
         
@@ -115,46 +190,59 @@ async def schedule_appointment(request: AppointmentRequest):
         appointment = {
             "appointment_id": appointment_id,
             "service_type": request.service_type,
-            "date": request.date,
-            "time": request.time,
+            "date": date_str,
+            "time": time_str,
             "customer_name": request.customer_name,
             "email": request.email,
             "phone": request.phone,
             "notes": request.notes,
             "status": "confirmed",
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
+            "created_at": now_iso,
+            "updated_at": now_iso,
             "confirmation_code": f"CODE-{random.randint(1000, 9999)}"
         }
         
         # Store appointment
-        appointments_db.append(appointment)
+        async with _write_lock:
+            appointments_db.append(appointment)
+            appointments_by_id[appointment_id] = appointment
+            _appointments_snapshot["version"] += 1
         
         # Simulate email sending (80% success rate)
         email_sent = random.random() > 0.2
         
-        logger.info(f"✅ Mock appointment scheduled: {appointment_id} for {request.customer_name}")
+        logger.debug("✅ Mock appointment scheduled: {} for {}", appointment_id, request.customer_name)
         
         return AppointmentResponse(
             success=True,
             appointment_id=appointment_id,
             message="Appointment scheduled successfully",
-            scheduled_time=f"{request.date} {request.time}",
+            scheduled_time=f"{date_str} {time_str}",
             confirmation_email_sent=email_sent
         )
         
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=f"Invalid date/time format: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error scheduling appointment: {e}")
         raise HTTPException(status_code=500, detail="Failed to schedule appointment")
 
 @app.get("/api/appointments")
-async def list_appointments(limit: int = 10, offset: int = 0):
+async def list_appointments(limit: int = 10, offset: int = 0, include_cancelled: bool = True):
     """List all appointments"""
+    appointments = _appointments_view()
+    
+    if include_cancelled or not cancelled_ids:
+        page = appointments[offset:offset + limit]
+        total = len(appointments)
+    else:
+        active = (a for a in appointments if a["appointment_id"] not in cancelled_ids)
+        page = list(islice(active, offset, offset + limit))
+        total = len(appointments) - len(cancelled_ids)
+    
     return {
-        "appointments": appointments_db[offset:offset + limit],
-        "total": len(appointments_db),
+        "appointments": page,
+        "total": total,
         "limit": limit,
         "offset": offset
     }
@@ -162,35 +250,38 @@ async def list_appointments(limit: int = 10, offset: int = 0):
 @app.get("/api/appointments/{appointment_id}")
 async def get_appointment(appointment_id: str):
     """Get specific appointment"""
-    for appointment in appointments_db:
-        if appointment["appointment_id"] == appointment_id:
-            return appointment
+    appointment = appointments_by_id.get(appointment_id)
+    if appointment is None:
+        raise HTTPException(status_code=404, detail="Appointment not found")
     
-    raise HTTPException(status_code=404, detail="Appointment not found")
+    return appointment
 
 @app.delete("/api/appointments/{appointment_id}")
 async def cancel_appointment(appointment_id: str):
     """Cancel an appointment"""
-    for i, appointment in enumerate(appointments_db):
-        if appointment["appointment_id"] == appointment_id:
-            # Update status
-            appointments_db[i]["status"] = "cancelled"
-            appointments_db[i]["updated_at"] = datetime.now().isoformat()
-            
-            logger.info(f"🗑️  Mock appointment cancelled: {appointment_id}")
-            
-            return {
-                "success": True,
-                "message": "Appointment cancelled successfully",
-                "appointment_id": appointment_id
-            }
+    appointment = appointments_by_id.get(appointment_id)
+    if appointment is None:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    
+    # Update status (shared with the record in appointments_db)
+    async with _write_lock:
+        appointment["status"] = "cancelled"
+        appointment["updated_at"] = datetime.now().isoformat()
+        cancelled_ids.add(appointment_id)
     
-    raise HTTPException(status_code=404, detail="Appointment not found")
+    logger.debug("🗑️  Mock appointment cancelled: {}", appointment_id)
+    
+    return {
+        "success": True,
+        "message": "Appointment cancelled successfully",
+        "appointment_id": appointment_id
+    }
 
 @app.post("/api/support/tickets")
 async def create_support_ticket(request: SupportTicketRequest):
     """Create a support ticket"""
     ticket_id = f"TICKET-{uuid.uuid4().hex[:8].upper()}"
+    now = datetime.now()
     
     ticket = {
         "ticket_id": ticket_id,
@@ -199,14 +290,16 @@ async def create_support_ticket(request: SupportTicketRequest):
         "description": request.description,
         "priority": request.priority,
         "status": "open",
-        "created_at": datetime.now().isoformat(),
+        "created_at": now.isoformat(),
         "assigned_to": None,
-        "estimated_resolution": (datetime.now() + timedelta(hours=random.randint(2, 48))).isoformat()
+        "estimated_resolution": (now + timedelta(hours=random.randint(2, 48))).isoformat()
     }
     
-    support_tickets_db.append(ticket)
+    async with _write_lock:
+        support_tickets_db.append(ticket)
+        tickets_by_status[ticket["status"]].append(ticket)
     
-    logger.info(f"🎫 Mock support ticket created: {ticket_id}")
+    logger.debug("🎫 Mock support ticket created: {}", ticket_id)
     
     return {
         "success": True,
@@ -221,7 +314,7 @@ async def list_support_tickets(status: Optional[str] = None, limit: int = 10):
     filtered_tickets = support_tickets_db
     
     if status:
-        filtered_tickets = [t for t in support_tickets_db if t["status"] == status]
+        filtered_tickets = tickets_by_status.get(status, [])
     
     return {
         "tickets": filtered_tickets[:limit],
@@ -243,9 +336,10 @@ async def register_user(request: UserRegistration):
         "status": "active"
     }
     
-    users_db.append(user)
+    async with _write_lock:
+        users_db.append(user)
     
-    logger.info(f"👤 Mock user registered: {user_id} - {request.name}")
+    logger.debug("👤 Mock user registered: {} - {}", user_id, request.name)
     
     return {
         "success": True,
@@ -264,22 +358,11 @@ async def list_users(limit: int = 10):
 @app.get("/api/system/status")
 async def system_status():
     """System status endpoint"""
-    return {
-        "system": {
-            "status": "operational",
-            "version": "1.0.0",
-            "uptime": f"{random.randint(100, 1000)} hours",
-            "load_average": f"{random.uniform(0.1, 2.5):.2f}",
-            "memory_usage_percent": random.randint(30, 80)
-        },
-        "services": {
-            "database": "online",
-            "email_service": "online" if random.random() > 0.1 else "degraded",
-            "payment_gateway": "online" if random.random() > 0.05 else "offline",
-            "sms_service": "online" if random.random() > 0.2 else "maintenance"
-        },
-        "timestamp": datetime.now().isoformat()
-    }
+    now = time.monotonic()
+    if _status_cache["value"] is None or now - _status_cache["refreshed_at"] > SNAPSHOT_TTL_SECONDS:
+        _status_cache["value"] = _build_system_status()
+        _status_cache["refreshed_at"] = now
+    return _status_cache["value"]
 
 @app.post("/api/notifications/send")
 async def send_notification():
@@ -301,9 +384,12 @@ if __name__ == "__main__":
     logger.info("📚 API Documentation: http://localhost:5001/docs")
     logger.info("🏥 Health Check: http://localhost:5001/api/health")
     
+    # Single worker; for multiple cores use `gunicorn -c gunicorn.conf.py mock_api:app`
     uvicorn.run(
         app,
         host="0.0.0.0",
         port=5001,
-        log_level="info"
+        http="httptools",
+        log_level="warning",
+        access_log=False
     )
\ No newline at end of file
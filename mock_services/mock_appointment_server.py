@@ -1,12 +1,18 @@
-
-
-from flask import Flask, request, jsonify
+from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
 from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
 import uuid
 import random
 import logging
+import uvicorn
 
-app = Flask(__name__)
+app = FastAPI(
+    title="Mock Appointment Server",
+    version="1.0.0"
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,9 +21,31 @@ logger = logging.getLogger(__name__)
 # In-memory storage
 appointments = []
 
-@app.route('/')
-def home():
-    return jsonify({
+
+class AppointmentRequest(BaseModel):
+    service_type: str
+    date: str
+    time: str
+    customer_name: str
+    email: str
+    phone: Optional[str] = ''
+    notes: Optional[str] = ''
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_error_handler(request: Request, exc: RequestValidationError):
+    """Return the legacy 400 error shape for invalid payloads"""
+    missing = [err['loc'][-1] for err in exc.errors() if err.get('type') == 'missing']
+    if missing:
+        error = f'Missing required field: {missing[0]}'
+    else:
+        error = 'Invalid request payload'
+    return JSONResponse(status_code=400, content={'success': False, 'error': error})
+
+
+@app.get('/')
+async def home():
+    return {
         'service': 'Mock Appointment Server',
         'version': '1.0.0',
         'endpoints': {
@@ -25,85 +53,82 @@ def home():
             'list': 'GET /api/appointments',
             'health': 'GET /api/health'
         }
-    })
+    }
 
-@app.route('/api/health', methods=['GET'])
-def health():
-    return jsonify({
+@app.get('/api/health')
+async def health():
+    return {
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'appointments_count': len(appointments)
-    })
+    }
 
-@app.route('/api/appointments', methods=['POST'])
-def schedule_appointment():
+@app.post('/api/appointments')
+async def schedule_appointment(data: AppointmentRequest):
     """Mock appointment scheduling endpoint"""
     try:
-        data = request.json
-        
-        # Validate required fields
-        required_fields = ['service_type', 'date', 'time', 'customer_name', 'email']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'success': False,
-                    'error': f'Missing required field: {field}'
-                }), 400
-        
         # Generate appointment ID
         appointment_id = f'APPT-{uuid.uuid4().hex[:6].upper()}'
-        
+
         # Create appointment
         appointment = {
             'appointment_id': appointment_id,
-            'service_type': data['service_type'],
-            'date': data['date'],
-            'time': data['time'],
-            'customer_name': data['customer_name'],
-            'email': data['email'],
-            'phone': data.get('phone', ''),
-            'notes': data.get('notes', ''),
+            'service_type': data.service_type,
+            'date': data.date,
+            'time': data.time,
+            'customer_name': data.customer_name,
+            'email': data.email,
+            'phone': data.phone or '',
+            'notes': data.notes or '',
             'status': 'confirmed',
             'created_at': datetime.now().isoformat(),
             'confirmation_code': str(random.randint(100000, 999999))
         }
-        
+
         # Store appointment
         appointments.append(appointment)
-        
-        logger.info(f'Appointment scheduled: {appointment_id}')
-        
+
+        logger.info('Appointment scheduled: %s', appointment_id)
+
         # Simulate random failures (10% chance)
         if random.random() < 0.1:
-            return jsonify({
+            return JSONResponse(status_code=503, content={
                 'success': False,
                 'error': 'Temporary service unavailable',
                 'retry': True
-            }), 503
-        
-        return jsonify({
+            })
+
+        return {
             'success': True,
             'appointment_id': appointment_id,
             'message': 'Appointment scheduled successfully',
             'confirmation_code': appointment['confirmation_code']
-        })
-        
+        }
+
     except Exception as e:
-        logger.error(f'Error scheduling appointment: {e}')
-        return jsonify({
+        logger.error('Error scheduling appointment: %s', e)
+        return JSONResponse(status_code=500, content={
             'success': False,
             'error': 'Internal server error'
-        }), 500
+        })
 
-@app.route('/api/appointments', methods=['GET'])
-def list_appointments():
+@app.get('/api/appointments')
+async def list_appointments():
     """List all appointments"""
-    return jsonify({
+    return {
         'appointments': appointments,
         'count': len(appointments),
         'timestamp': datetime.now().isoformat()
-    })
+    }
 
 if __name__ == '__main__':
     logger.info('Starting Mock Appointment Server on port 5002...')
-    app.run(host='0.0.0.0', port=5002, debug=True)
+    # Single-process ASGI server; for multiple cores run under
+    # `gunicorn -k uvicorn.workers.UvicornWorker -w N mock_appointment_server:app`
+    uvicorn.run(
+        app,
+        host='0.0.0.0',
+        port=5002,
+        http='httptools',
+        log_level='warning'
+    )
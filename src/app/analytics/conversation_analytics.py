@@ -3,61 +3,103 @@ Conversation analytics and tracking module.
 Tracks conversation metrics, user behavior, and chatbot performance.
 """
 
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
-from collections import defaultdict
+import csv
+import io
+from typing import Dict, Iterator, List, Optional, Any
+from datetime import date, datetime, timedelta
+from collections import Counter, defaultdict, deque
+from itertools import islice
 from loguru import logger
 
+# Number of most recent conversations kept for windowed reports
+RECENT_WINDOW_SIZE = 500
+
 
 class ConversationAnalytics:
     """Tracks and analyzes conversation metrics"""
     
     def __init__(self):
-        self.conversations: List[Dict] = []
+        # Conversations are stored in arrival (chronological) order
+        self.conversations: deque = deque()
+        self.recent_conversations: deque = deque(maxlen=RECENT_WINDOW_SIZE)
+        self._earliest_conversation: Optional[Dict] = None
         self.metrics = {
             'total_conversations': 0,
             'total_messages': 0,
             'average_response_time_ms': 0,
+            'response_time_total_ms': 0,
+            'response_time_count': 0,
+            'escalation_count': 0,
             'escalation_rate': 0.0,
             'intent_distribution': defaultdict(int),
             'user_satisfaction_scores': [],
             'active_users': set(),
-            'hourly_activity': defaultdict(int)
+            'hourly_activity': [0] * 24
         }
         
         # Store conversations by user for faster lookups
-        self.conversations_by_user: Dict[str, List[Dict]] = defaultdict(list)
+        self.conversations_by_user: Dict[str, deque] = defaultdict(deque)
+        
+        # Store conversations by calendar day for daily reports
+        self.conversations_by_day: Dict[date, deque] = defaultdict(deque)
+        
+        # Running [sum_ms, count] of response times per calendar day
+        self.response_time_by_day: Dict[date, List[float]] = defaultdict(lambda: [0.0, 0])
         
         logger.info("📊 Conversation analytics initialized")
     
     def track_conversation(self, conversation_data: Dict[str, Any]):
         """Track a single conversation exchange"""
         try:
+            # Keep a private copy; the caller's dict is never modified
+            record = dict(conversation_data)
+            
             # Add timestamp if not present
-            if 'timestamp' not in conversation_data:
-                conversation_data['timestamp'] = datetime.now().isoformat()
+            if 'timestamp' not in record:
+                record['timestamp'] = datetime.now().isoformat()
+            
+            # Parse the timestamp once; downstream metrics read '_ts' (stripped on export)
+            record['_ts'] = self._parse_timestamp(record['timestamp'])
             
             # Add unique ID
-            if 'conversation_id' not in conversation_data:
-                conversation_data['conversation_id'] = f"conv_{len(self.conversations) + 1}"
+            if 'conversation_id' not in record:
+                record['conversation_id'] = f"conv_{len(self.conversations) + 1}"
             
             # Store conversation
-            self.conversations.append(conversation_data)
+            self.conversations.append(record)
+            self.recent_conversations.append(record)
+            self.conversations_by_day[record['_ts'].date()].append(record)
+            
+            earliest = self._earliest_conversation
+            if earliest is None or record['_ts'] < earliest['_ts']:
+                self._earliest_conversation = record
             
             # Update user-specific tracking
-            user_id = conversation_data.get('user_id')
+            user_id = record.get('user_id')
             if user_id:
-                self.conversations_by_user[user_id].append(conversation_data)
+                self.conversations_by_user[user_id].append(record)
                 self.metrics['active_users'].add(user_id)
             
             # Update metrics
-            self._update_metrics(conversation_data)
+            self._update_metrics(record)
             
-            logger.debug(f"📝 Tracked conversation for user {user_id}")
+            logger.debug("📝 Tracked conversation for user {}", user_id)
             
         except Exception as e:
             logger.error(f"❌ Error tracking conversation: {e}")
     
+    @staticmethod
+    def _parse_timestamp(timestamp: Any) -> datetime:
+        """Parse an ISO timestamp into a naive local datetime (now if invalid)"""
+        try:
+            dt = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+        except ValueError:
+            return datetime.now()
+        
+        if dt.tzinfo is not None:
+            dt = dt.astimezone().replace(tzinfo=None)
+        return dt
+    
     def _update_metrics(self, conversation_data: Dict[str, Any]):
         """Update analytics metrics with new conversation data"""
         # Increment counters
@@ -68,31 +110,42 @@ class ConversationAnalytics:
         intent = conversation_data.get('intent', 'unknown')
         self.metrics['intent_distribution'][intent] += 1
         
-        # Track hourly activity
-        timestamp = conversation_data.get('timestamp')
-        if timestamp:
-            try:
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                hour_key = f"{dt.hour:02d}:00"
-                self.metrics['hourly_activity'][hour_key] += 1
-            except:
-                pass
-        
-        # Update average response time
+        # Track hourly activity (one slot per hour of the day)
+        self.metrics['hourly_activity'][conversation_data['_ts'].hour] += 1
+        
+        # Update average response time from a running total
         response_time = conversation_data.get('response_time')
         if response_time:
-            current_avg = self.metrics['average_response_time_ms']
-            count = self.metrics['total_conversations']
+            self.metrics['response_time_total_ms'] += response_time
+            self.metrics['response_time_count'] += 1
             self.metrics['average_response_time_ms'] = (
-                (current_avg * (count - 1) + response_time) / count
+                self.metrics['response_time_total_ms'] / self.metrics['response_time_count']
             )
-        
-        # Update escalation rate
-        needs_escalation = conversation_data.get('needs_escalation', False)
-        if needs_escalation:
-            total_conv = self.metrics['total_conversations']
-            escalations = sum(1 for conv in self.conversations if conv.get('needs_escalation'))
-            self.metrics['escalation_rate'] = (escalations / total_conv) * 100 if total_conv > 0 else 0
+            
+            day_totals = self.response_time_by_day[conversation_data['_ts'].date()]
+            day_totals[0] += response_time
+            day_totals[1] += 1
+        
+        # Update escalation rate from a running count
+        if conversation_data.get('needs_escalation', False):
+            self.metrics['escalation_count'] += 1
+        self._update_escalation_rate()
+    
+    def _update_escalation_rate(self):
+        """Recompute escalation rate from the running escalation count"""
+        total_conv = self.metrics['total_conversations']
+        self.metrics['escalation_rate'] = (
+            (self.metrics['escalation_count'] / total_conv) * 100 if total_conv > 0 else 0
+        )
+    
+    @staticmethod
+    def _format_hourly(hourly_counts: List[int]) -> Dict[str, int]:
+        """Convert 24 hourly slots into {'HH:00': count} for non-empty hours"""
+        return {f"{hour:02d}:00": count for hour, count in enumerate(hourly_counts) if count}
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Running metrics with hourly activity as {'HH:00': count}"""
+        return {**self.metrics, 'hourly_activity': self._format_hourly(self.metrics['hourly_activity'])}
     
     def get_conversation_insights(self, user_id: Optional[str] = None) -> Dict[str, Any]:
         """Get insights for specific user or all users"""
@@ -102,7 +155,7 @@ class ConversationAnalytics:
         else:
             return self._analyze_all_conversations()
     
-    def _analyze_user_conversations(self, user_id: str, conversations: List[Dict]) -> Dict[str, Any]:
+    def _analyze_user_conversations(self, user_id: str, conversations: deque) -> Dict[str, Any]:
         """Analyze conversations for a specific user"""
         if not conversations:
             return {
@@ -113,15 +166,14 @@ class ConversationAnalytics:
         
         # Calculate user-specific metrics
         total_conversations = len(conversations)
-        recent_conversations = conversations[-10:]  # Last 10 conversations
+        recent_conversations = list(islice(conversations, max(total_conversations - 10, 0), None))  # Last 10 conversations
         
         # Intent analysis
-        intents = [conv.get('intent', 'unknown') for conv in recent_conversations]
-        most_common_intent = max(set(intents), key=intents.count) if intents else 'unknown'
+        intent_counts = Counter(conv.get('intent', 'unknown') for conv in recent_conversations)
+        most_common_intent = intent_counts.most_common(1)[0][0] if intent_counts else 'unknown'
         
         # Response time analysis
-        response_times = [conv.get('response_time', 0) for conv in recent_conversations if conv.get('response_time')]
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
+        avg_response_time = self._average_response_time(recent_conversations)
         
         # Escalation analysis
         escalations = [conv for conv in recent_conversations if conv.get('needs_escalation')]
@@ -131,7 +183,7 @@ class ConversationAnalytics:
             'total_conversations': total_conversations,
             'recent_conversations_count': len(recent_conversations),
             'most_common_intent': most_common_intent,
-            'intent_distribution': {intent: intents.count(intent) for intent in set(intents)},
+            'intent_distribution': dict(intent_counts),
             'average_response_time_ms': round(avg_response_time, 2),
             'escalation_count': len(escalations),
             'escalation_rate': (len(escalations) / len(recent_conversations)) * 100 if recent_conversations else 0,
@@ -155,24 +207,24 @@ class ConversationAnalytics:
                 'total_conversations': 0
             }
         
-        recent_conversations = self.conversations[-50:]  # Last 50 conversations
+        recent_conversations = list(self._iter_recent(50))  # Last 50 conversations
         
         # Calculate overall metrics
         total_users = len(self.metrics['active_users'])
         
         # Response time analysis
-        response_times = [conv.get('response_time', 0) for conv in recent_conversations if conv.get('response_time')]
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
+        avg_response_time = self._average_response_time(recent_conversations)
         
         # Intent analysis
-        intents = [conv.get('intent', 'unknown') for conv in recent_conversations]
-        intent_distribution = {intent: intents.count(intent) for intent in set(intents)}
+        intent_counts = Counter(conv.get('intent', 'unknown') for conv in recent_conversations)
+        intent_distribution = dict(intent_counts)
         
         # Escalation analysis
         escalations = [conv for conv in recent_conversations if conv.get('needs_escalation')]
         
         # User engagement
         active_today = self._get_active_users_today()
+        hourly_activity = self._format_hourly(self.metrics['hourly_activity'])
         
         return {
             'total_conversations': self.metrics['total_conversations'],
@@ -181,7 +233,7 @@ class ConversationAnalytics:
             'average_response_time_ms': round(avg_response_time, 2),
             'escalation_rate': self.metrics['escalation_rate'],
             'intent_distribution': intent_distribution,
-            'hourly_activity': dict(self.metrics['hourly_activity']),
+            'hourly_activity': hourly_activity,
             'recent_escalations': [
                 {
                     'user_id': esc.get('user_id'),
@@ -191,29 +243,34 @@ class ConversationAnalytics:
                 }
                 for esc in escalations[-10:]  # Last 10 escalations
             ],
-            'top_intents': sorted(intent_distribution.items(), key=lambda x: x[1], reverse=True)[:5],
-            'peak_hours': sorted(self.metrics['hourly_activity'].items(), key=lambda x: x[1], reverse=True)[:3]
+            'top_intents': intent_counts.most_common(5),
+            'peak_hours': sorted(hourly_activity.items(), key=lambda x: x[1], reverse=True)[:3]
         }
     
-    def _calculate_conversation_frequency(self, conversations: List[Dict]) -> Dict[str, Any]:
+    @staticmethod
+    def _average_response_time(conversations: List[Dict]) -> float:
+        """Average of the non-empty response times in a single pass"""
+        total = 0.0
+        count = 0
+        for conv in conversations:
+            response_time = conv.get('response_time')
+            if response_time:
+                total += response_time
+                count += 1
+        return total / count if count else 0
+    
+    def _iter_recent(self, count: int):
+        """Iterate over the last `count` conversations from the recent window"""
+        recent = self.recent_conversations
+        return islice(recent, max(len(recent) - count, 0), None)
+    
+    def _calculate_conversation_frequency(self, conversations: deque) -> Dict[str, Any]:
         """Calculate conversation frequency for a user"""
         if len(conversations) < 2:
             return {'average_gap_minutes': 0, 'frequency': 'low'}
         
         # Calculate time gaps between conversations
-        timestamps = []
-        for conv in conversations:
-            try:
-                ts = datetime.fromisoformat(conv.get('timestamp', '').replace('Z', '+00:00'))
-                timestamps.append(ts)
-            except:
-                pass
-        
-        if len(timestamps) < 2:
-            return {'average_gap_minutes': 0, 'frequency': 'low'}
-        
-        # Sort and calculate gaps
-        timestamps.sort()
+        timestamps = sorted(conv['_ts'] for conv in conversations)
         gaps = []
         for i in range(1, len(timestamps)):
             gap = (timestamps[i] - timestamps[i-1]).total_seconds() / 60
@@ -244,27 +301,18 @@ class ConversationAnalytics:
         active_users = set()
         cutoff_time = datetime.now() - timedelta(hours=24)
         
-        for conv in self.conversations[-100:]:  # Check recent 100 conversations
-            timestamp = conv.get('timestamp')
+        for conv in self._iter_recent(100):  # Check recent 100 conversations
             user_id = conv.get('user_id')
-            
-            if timestamp and user_id:
-                try:
-                    conv_time = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                    if conv_time > cutoff_time:
-                        active_users.add(user_id)
-                except:
-                    continue
+            if user_id and conv['_ts'] > cutoff_time:
+                active_users.add(user_id)
         
         return list(active_users)
     
     def get_daily_report(self) -> Dict[str, Any]:
         """Generate daily report"""
-        today = datetime.now().strftime('%Y-%m-%d')
-        today_conversations = [
-            conv for conv in self.conversations
-            if conv.get('timestamp', '').startswith(today)
-        ]
+        today_date = datetime.now().date()
+        today = today_date.isoformat()
+        today_conversations = self.conversations_by_day.get(today_date, [])
         
         if not today_conversations:
             return {
@@ -277,26 +325,23 @@ class ConversationAnalytics:
         today_users = set(conv.get('user_id') for conv in today_conversations if conv.get('user_id'))
         
         # Intent distribution for today
-        today_intents = [conv.get('intent', 'unknown') for conv in today_conversations]
-        intent_distribution = {intent: today_intents.count(intent) for intent in set(today_intents)}
+        intent_counts = Counter(conv.get('intent', 'unknown') for conv in today_conversations)
+        intent_distribution = dict(intent_counts)
         
         # Escalations today
         today_escalations = [conv for conv in today_conversations if conv.get('needs_escalation')]
         
         # Response times today
-        response_times = [conv.get('response_time', 0) for conv in today_conversations if conv.get('response_time')]
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
+        rt_sum, rt_count = self.response_time_by_day.get(today_date, (0.0, 0))
+        avg_response_time = rt_sum / rt_count if rt_count else 0
         
         # Hourly breakdown for today
-        hourly_breakdown = defaultdict(int)
+        hourly_counts = [0] * 24
         for conv in today_conversations:
-            timestamp = conv.get('timestamp')
-            if timestamp:
-                try:
-                    hour = datetime.fromisoformat(timestamp.replace('Z', '+00:00')).hour
-                    hourly_breakdown[f"{hour:02d}:00"] += 1
-                except:
-                    pass
+            hourly_counts[conv['_ts'].hour] += 1
+        
+        peak_hour = max(range(24), key=hourly_counts.__getitem__)
+        peak_hour_today = (f"{peak_hour:02d}:00", hourly_counts[peak_hour])
         
         return {
             'date': today,
@@ -306,22 +351,18 @@ class ConversationAnalytics:
             'escalation_count': len(today_escalations),
             'escalation_rate': (len(today_escalations) / len(today_conversations)) * 100 if today_conversations else 0,
             'intent_distribution': intent_distribution,
-            'hourly_breakdown': dict(hourly_breakdown),
-            'top_intents_today': sorted(intent_distribution.items(), key=lambda x: x[1], reverse=True)[:3],
-            'peak_hour_today': max(hourly_breakdown.items(), key=lambda x: x[1]) if hourly_breakdown else ('00:00', 0),
-            'busiest_hour': max(hourly_breakdown.items(), key=lambda x: x[1]) if hourly_breakdown else ('00:00', 0)
+            'hourly_breakdown': self._format_hourly(hourly_counts),
+            'top_intents_today': intent_counts.most_common(3),
+            'peak_hour_today': peak_hour_today,
+            'busiest_hour': peak_hour_today
         }
     
     def get_earliest_conversation_date(self) -> Optional[str]:
         """Get date of earliest conversation"""
-        if not self.conversations:
+        if self._earliest_conversation is None:
             return None
         
-        earliest = min(
-            conv.get('timestamp') for conv in self.conversations 
-            if conv.get('timestamp')
-        )
-        return earliest
+        return self._earliest_conversation.get('timestamp')
     
     def clear_old_conversations(self, days_to_keep: int = 30):
         """Clear conversations older than specified days"""
@@ -329,56 +370,79 @@ class ConversationAnalytics:
             return
         
         cutoff_time = datetime.now() - timedelta(days=days_to_keep)
-        initial_count = len(self.conversations)
+        conversations = self.conversations
+        removed = 0
         
-        # Filter conversations
-        self.conversations = [
-            conv for conv in self.conversations
-            if self._is_conversation_recent(conv, cutoff_time)
-        ]
+        # Conversations are chronological, so evict from the left until the first recent one
+        while conversations and not self._is_conversation_recent(conversations[0], cutoff_time):
+            old = conversations.popleft()
+            removed += 1
+            
+            if self.recent_conversations and self.recent_conversations[0] is old:
+                self.recent_conversations.popleft()
+            
+            user_id = old.get('user_id')
+            if user_id:
+                user_conversations = self.conversations_by_user[user_id]
+                user_conversations.popleft()
+                if not user_conversations:
+                    del self.conversations_by_user[user_id]
+            
+            day = old['_ts'].date()
+            day_conversations = self.conversations_by_day[day]
+            day_conversations.popleft()
+            if not day_conversations:
+                del self.conversations_by_day[day]
+                self.response_time_by_day.pop(day, None)
+            elif old.get('response_time'):
+                day_totals = self.response_time_by_day[day]
+                day_totals[0] -= old['response_time']
+                day_totals[1] -= 1
+            
+            if old.get('needs_escalation'):
+                self.metrics['escalation_count'] -= 1
         
-        removed = initial_count - len(self.conversations)
         if removed > 0:
             logger.info(f"🗑️  Cleared {removed} old conversations (older than {days_to_keep} days)")
-            
-            # Rebuild user index
-            self.conversations_by_user.clear()
-            for conv in self.conversations:
-                user_id = conv.get('user_id')
-                if user_id:
-                    self.conversations_by_user[user_id].append(conv)
+            self._update_escalation_rate()
+            self._earliest_conversation = conversations[0] if conversations else None
     
     def _is_conversation_recent(self, conversation: Dict, cutoff_time: datetime) -> bool:
         """Check if conversation is recent"""
-        timestamp = conversation.get('timestamp')
-        if not timestamp:
-            return False
-        
-        try:
-            conv_time = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            return conv_time > cutoff_time
-        except:
-            return False
+        return conversation['_ts'] > cutoff_time
     
     def export_conversations(self, format: str = 'json') -> Any:
         """Export conversations in specified format"""
         if format == 'json':
-            return self.conversations
+            return [
+                {key: value for key, value in conv.items() if key != '_ts'}
+                for conv in self.conversations
+            ]
         elif format == 'csv':
-            # Simple CSV export (in real implementation, use csv module)
-            headers = ['timestamp', 'user_id', 'intent', 'response_time_ms', 'needs_escalation']
-            csv_lines = [','.join(headers)]
-            
-            for conv in self.conversations:
-                row = [
-                    conv.get('timestamp', ''),
-                    conv.get('user_id', ''),
-                    conv.get('intent', ''),
-                    str(conv.get('response_time', '')),
-                    str(conv.get('needs_escalation', False))
-                ]
-                csv_lines.append(','.join(row))
-            
-            return '\n'.join(csv_lines)
+            return ''.join(self.iter_conversations_csv())
         else:
-            raise ValueError(f"Unsupported format: {format}")
\ No newline at end of file
+            raise ValueError(f"Unsupported format: {format}")
+    
+    def iter_conversations_csv(self) -> Iterator[str]:
+        """Yield the conversation export as CSV lines (suitable for streaming responses)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        
+        def flush() -> str:
+            line = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return line
+        
+        writer.writerow(['timestamp', 'user_id', 'intent', 'response_time_ms', 'needs_escalation'])
+        yield flush()
+        
+        for conv in self.conversations:
+            writer.writerow([
+                conv.get('timestamp', ''),
+                conv.get('user_id', ''),
+                conv.get('intent', ''),
+                conv.get('response_time', ''),
+                conv.get('needs_escalation', False)
+            ])
+            yield flush()
@@ -1,62 +1,116 @@
 import httpx
-import json
+import orjson
 import asyncio
-from typing import Dict, Any, Optional
+import random
+import time
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime  
+from email_validator import validate_email, EmailNotValidError
 from loguru import logger
 from app.config.settings import settings
 from app.utils.circuit_breaker import CircuitBreaker
 
+# Retry policy for outbound calls (seconds)
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 4.0
+RETRY_TOTAL_TIMEOUT = 10.0
+RETRY_ATTEMPT_TIMEOUT = 8.0
+RETRYABLE_ERRORS = (
+    httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError, asyncio.TimeoutError
+)
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Health probes are cached briefly and never allowed to hang
+HEALTH_CHECK_TTL = 5.0
+HEALTH_CHECK_TIMEOUT = httpx.Timeout(2.0)
+
+REQUIRED_APPOINTMENT_FIELDS = ('service_type', 'date', 'time', 'customer_name', 'email')
+OPTIONAL_APPOINTMENT_FIELDS = ('phone', 'notes')
+
+@lru_cache(maxsize=1024)
+def _validate_appointment_values(values: Tuple[Optional[str], ...]) -> Tuple[Tuple[str, str], ...]:
+    """Validate stripped appointment values; invalid input raises and is not cached"""
+    fields = REQUIRED_APPOINTMENT_FIELDS + OPTIONAL_APPOINTMENT_FIELDS
+    validated = {field: value for field, value in zip(fields, values) if value is not None}
+    
+    for field in REQUIRED_APPOINTMENT_FIELDS:
+        if not validated[field]:
+            raise ValueError(f"Empty value for field: {field}")
+    
+    # Email validation (syntax only, no DNS lookups); store the normalized form
+    try:
+        validated['email'] = validate_email(validated['email'], check_deliverability=False).normalized
+    except EmailNotValidError as e:
+        raise ValueError(f"Invalid email: {e}")
+    
+    return tuple(validated.items())
+
+# Error responses are only previewed, never decoded in full
+ERROR_BODY_PREVIEW_BYTES = 512
+
+async def _read_body_preview(response: httpx.Response, limit: int = ERROR_BODY_PREVIEW_BYTES) -> str:
+    """Read at most `limit` bytes of a streamed response body and close it"""
+    preview = b""
+    try:
+        async for chunk in response.aiter_bytes():
+            preview += chunk
+            if len(preview) >= limit:
+                break
+    finally:
+        await response.aclose()
+    return preview[:limit].decode('utf-8', errors='replace')
+
+# Single breaker guarding the scheduling endpoint for every APIClient
+SCHEDULE_BREAKER = CircuitBreaker(
+    failure_threshold=3,
+    recovery_timeout=30,
+    expected_exceptions=(httpx.RequestError, asyncio.TimeoutError)
+)
+
+# One connection pool shared by every APIClient so keep-alive connections
+# are reused across instances; created lazily and closed on app shutdown.
+_shared_client: Optional[httpx.AsyncClient] = None
+
+async def get_shared_client() -> httpx.AsyncClient:
+    """Return the process-wide HTTP client, creating it on first use"""
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        # Pool settings belong on the transport: httpx ignores client-level
+        # limits/http2 when a custom transport is supplied.
+        _shared_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            transport=httpx.AsyncHTTPTransport(
+                retries=3,
+                http2=True,
+                limits=httpx.Limits(max_connections=256, keepalive_expiry=15.0)
+            )
+        )
+    return _shared_client
+
+async def close_shared_client():
+    """Close the process-wide HTTP client if it was created"""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.aclose()
+        _shared_client = None
+
 class APIClient:
     """Enhanced API client with retry logic and circuit breaker"""
     
     def __init__(self):
         self.base_url = settings.MOCK_API_URL
-        self.client = httpx.AsyncClient(
-            timeout=30.0,
-            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
-            transport=httpx.AsyncHTTPTransport(retries=3)
-        )
         
-        # Circuit breaker for external API calls
-        self.circuit_breaker = CircuitBreaker(
-            failure_threshold=3,
-            recovery_timeout=30,
-            expected_exceptions=(httpx.RequestError,)
-        )
+        # Cached (result, monotonic timestamp) of the last health probe
+        self._last_health = (None, 0.0)
+        self._health_ttl = HEALTH_CHECK_TTL
+        self._health_lock = asyncio.Lock()
     
-    @CircuitBreaker(failure_threshold=3, recovery_timeout=30)
     async def schedule_appointment(self, appointment_data: Dict) -> Dict[str, Any]:
-        """Schedule appointment with retry logic"""
+        """Schedule appointment with retry logic behind the shared circuit breaker"""
         try:
-            url = f"{self.base_url}{settings.APPOINTMENT_API_ENDPOINT}"
-            
-            # Prepare payload with validation
-            payload = self._validate_appointment_data(appointment_data)
-            
-            # Make request with retry
-            response = await self._make_request_with_retry(
-                "POST", url, json=payload, max_retries=3
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                logger.info(f"Appointment scheduled: {result.get('appointment_id')}")
-                return {
-                    "success": True,
-                    "appointment_id": result.get('appointment_id'),
-                    "message": "Appointment scheduled successfully",
-                    "details": payload,
-                    "timestamp": response.headers.get('date', '')
-                }
-            else:
-                logger.error(f"API Error: {response.status_code} - {response.text}")
-                return {
-                    "success": False,
-                    "error": f"API returned {response.status_code}",
-                    "details": response.text[:200]
-                }
-                
+            return await SCHEDULE_BREAKER.call(self._schedule_appointment_impl, appointment_data)
         except Exception as e:
             logger.error(f"Appointment scheduling failed: {e}")
             return {
@@ -65,76 +119,132 @@ class APIClient:
                 "fallback": True
             }
     
-    async def _make_request_with_retry(
-        self, method: str, url: str, 
-        max_retries: int = 3, **kwargs
+    async def _schedule_appointment_impl(self, appointment_data: Dict) -> Dict[str, Any]:
+        """Send the appointment request; transport errors propagate to the breaker"""
+        url = f"{self.base_url}{settings.APPOINTMENT_API_ENDPOINT}"
+        
+        # Prepare payload with validation
+        payload = self._validate_appointment_data(appointment_data)
+        
+        # Build the request once (URL parse + orjson body) and resend it on retries
+        client = await get_shared_client()
+        request = client.build_request(
+            "POST", url, content=orjson.dumps(payload), headers=JSON_HEADERS
+        )
+        # Streamed so error bodies are never read past a small preview
+        response = await self._send_with_retry(request, max_retries=3, stream=True)
+        
+        if response.status_code == 200:
+            result = orjson.loads(await response.aread())
+            logger.info(f"Appointment scheduled: {result.get('appointment_id')}")
+            return {
+                "success": True,
+                "appointment_id": result.get('appointment_id'),
+                "message": "Appointment scheduled successfully",
+                "details": payload,
+                "timestamp": response.headers.get('date', '')
+            }
+        else:
+            error_body = await _read_body_preview(response)
+            logger.error(f"API Error: {response.status_code} - {error_body}")
+            return {
+                "success": False,
+                "error": f"API returned {response.status_code}",
+                "details": error_body[:200]
+            }
+    
+    async def _send_with_retry(
+        self, request: httpx.Request,
+        max_retries: int = 3, total_timeout: float = RETRY_TOTAL_TIMEOUT,
+        stream: bool = False
     ) -> httpx.Response:
-        """Make HTTP request with exponential backoff retry"""
+        """Send a prebuilt request, retrying with backoff within a total time budget.
+        
+        With stream=True the returned response body is unread; the caller must
+        read or close it.
+        """
+        client = await get_shared_client()
+        url = request.url
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + total_timeout
+        wait_time = RETRY_BASE_DELAY
+        
         for attempt in range(max_retries):
+            is_last_attempt = attempt == max_retries - 1
+            # Bound the whole attempt so a stuck request fails fast into a retry,
+            # and never let it run past the total budget
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"Retry budget exhausted for {url}")
             try:
-                response = await self.client.request(method, url, **kwargs)
+                response = await asyncio.wait_for(
+                    client.send(request, stream=stream), timeout=min(RETRY_ATTEMPT_TIMEOUT, remaining)
+                )
                 
                 # Retry on server errors
-                if 500 <= response.status_code < 600 and attempt < max_retries - 1:
-                    wait_time = 2 ** attempt  # Exponential backoff
-                    logger.warning(f"Retry {attempt + 1}/{max_retries} for {url}")
-                    await asyncio.sleep(wait_time)
-                    continue
+                if not 500 <= response.status_code < 600 or is_last_attempt:
+                    return response
+                reason = f"server error {response.status_code}"
                 
+            except RETRYABLE_ERRORS as e:
+                if is_last_attempt:
+                    raise
+                response, last_error = None, e
+                reason = f"network error: {e or type(e).__name__}"
+            
+            # Decorrelated jitter keeps concurrent sessions from retrying in lockstep
+            wait_time = min(RETRY_MAX_DELAY, random.uniform(RETRY_BASE_DELAY, wait_time * 3))
+            if loop.time() + wait_time > deadline:
+                logger.warning(f"Retry budget exhausted for {url} after {reason}")
+                if response is None:
+                    raise last_error
                 return response
-                
-            except (httpx.TimeoutException, httpx.NetworkError) as e:
-                if attempt == max_retries - 1:
-                    raise e
-                
-                wait_time = 2 ** attempt
-                logger.warning(f"Network error, retrying in {wait_time}s: {e}")
-                await asyncio.sleep(wait_time)
+            
+            logger.warning(f"Retry {attempt + 1}/{max_retries} for {url} in {wait_time:.2f}s ({reason})")
+            if response is not None:
+                await response.aclose()  # release the connection before backing off
+            await asyncio.sleep(wait_time)
     
     def _validate_appointment_data(self, data: Dict) -> Dict:
         """Validate and sanitize appointment data"""
-        required_fields = ['service_type', 'date', 'time', 'customer_name', 'email']
-        
-        validated = {}
-        for field in required_fields:
+        for field in REQUIRED_APPOINTMENT_FIELDS:
             if field not in data:
                 raise ValueError(f"Missing required field: {field}")
-            
-            value = str(data[field]).strip()
-            if not value:
-                raise ValueError(f"Empty value for field: {field}")
-            
-            validated[field] = value
         
-        # Optional fields
-        optional_fields = ['phone', 'notes']
-        for field in optional_fields:
-            if field in data and data[field]:
-                validated[field] = str(data[field]).strip()
-        
-        # Email validation
-        import re
-        email_regex = r'^[\w\.-]+@[\w\.-]+\.\w+$'
-        if not re.match(email_regex, validated['email']):
-            raise ValueError("Invalid email format")
-        
-        return validated
+        # Identical submissions (retries, re-confirmation) hit the cache
+        key = tuple(str(data[field]).strip() for field in REQUIRED_APPOINTMENT_FIELDS) + tuple(
+            str(data[field]).strip() if field in data and data[field] else None
+            for field in OPTIONAL_APPOINTMENT_FIELDS
+        )
+        return dict(_validate_appointment_values(key))
     
     async def close(self):
-        """Close HTTP client"""
-        await self.client.aclose()
+        """Close the shared HTTP client"""
+        await close_shared_client()
     
     async def health_check(self) -> Dict:
-        """Check API health"""
-        try:
-            response = await self.client.get(f"{self.base_url}/api/health", timeout=5.0)
-            return {
-                "healthy": response.status_code == 200,
-                "status_code": response.status_code,
-                "response_time": response.elapsed.total_seconds()
-            }
-        except Exception as e:
-            return {
-                "healthy": False,
-                "error": str(e)
-            }
\ No newline at end of file
+        """Check API health, reusing a recent result within the TTL"""
+        if time.monotonic() - self._last_health[1] < self._health_ttl:
+            return self._last_health[0]
+        
+        # Concurrent callers wait for a single probe instead of stampeding
+        async with self._health_lock:
+            if time.monotonic() - self._last_health[1] < self._health_ttl:
+                return self._last_health[0]
+            
+            try:
+                client = await get_shared_client()
+                response = await client.get(f"{self.base_url}/api/health", timeout=HEALTH_CHECK_TIMEOUT)
+                result = {
+                    "healthy": response.status_code == 200,
+                    "status_code": response.status_code,
+                    "response_time": response.elapsed.total_seconds()
+                }
+            except Exception as e:
+                result = {
+                    "healthy": False,
+                    "error": str(e)
+                }
+            
+            self._last_health = (result, time.monotonic())
+            return result
@@ -3,14 +3,143 @@ Appointment flow management.
 Handles the state machine for appointment booking and modification.
 """
 
-from typing import Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, Optional, Tuple
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 import re
 from loguru import logger
 
 from app.config.business_rules import VALID_SERVICES
 from app.config.response_templates import ResponseTemplates
 from app.utils.date_time_parser import DateTimeParser
+from app.chatbot.conversation_state import ConversationState
+from app.utils.keyword_scanner import build_keyword_scanner, first_keyword_match, lowest_bit
+
+# Patterns compiled once at import instead of on every message
+_NAME_PATTERNS = [
+    re.compile(p, re.IGNORECASE) for p in (
+        r'my name is\s+([A-Za-z\s]{2,})',
+        r'i am\s+([A-Za-z\s]{2,})',
+        r'i\'m\s+([A-Za-z\s]{2,})',
+        r'call me\s+([A-Za-z\s]{2,})',
+        r'this is\s+([A-Za-z\s]{2,})',
+        r'name\s+is\s+([A-Za-z\s]{2,})',
+        r'^([A-Za-z]{2,}\s+[A-Za-z]{2,})$'  # First Last only if not date/time
+    )
+]
+# Union of all name patterns: one pass tells whether any of them can match
+_NAME_UNION_RE = re.compile('|'.join(f'(?:{p.pattern})' for p in _NAME_PATTERNS), re.IGNORECASE)
+_EMAIL_RE = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
+_WS_RE = re.compile(r'\s+')
+_DIGIT_RE = re.compile(r'\d')
+_WORD_RE = re.compile(r'[a-z]+')
+
+# Date/time words that should NOT be extracted as names, matched as whole tokens
+_DATE_TIME_WORDS = frozenset({
+    'today', 'tomorrow', 'yesterday', 'morning', 'afternoon', 'evening',
+    'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday',
+    'january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+    'september', 'october', 'november', 'december',
+    'am', 'pm', 'noon', 'midnight'
+})
+
+# Shown when the requested slot is booked or held by another customer
+_SLOT_TAKEN_MSG = (
+    "❌ **Time Unavailable:** **{time}** on **{date}** is no longer available.\n\n"
+    "🕐 **Please choose a different time.**{available}"
+)
+
+# Greetings and fillers that are never a name on their own
+_COMMON_WORDS = frozenset({'hi', 'hello', 'hey', 'ok', 'yes', 'no', 'thanks', 'thank'})
+
+# Keyword screening groups (see app.utils.keyword_scanner)
+# Services in match priority order
+_SERVICE_KEYWORDS = (
+    ('consultation', ('consultation', 'consult', 'advice', 'guidance')),
+    ('support', ('support', 'help', 'assistance', 'fix', 'issue')),
+    ('installation', ('installation', 'install', 'setup', 'implement')),
+    ('maintenance', ('maintenance', 'maintain', 'service', 'checkup')),
+    ('training', ('training', 'train', 'learn', 'teach', 'educate')),
+    ('demo', ('demo', 'demonstration', 'show', 'presentation'))
+)
+
+# Modifiable fields in match priority order
+_FIELD_KEYWORDS = (
+    ('service_type', ('service', 'service type', 'type')),
+    ('date', ('date', 'day')),
+    ('time', ('time', 'hour', 'schedule')),
+    ('customer_name', ('name',)),
+    ('email', ('email', 'contact'))
+)
+
+
+_SERVICE_SCANNER = build_keyword_scanner(_SERVICE_KEYWORDS)
+_FIELD_SCANNER = build_keyword_scanner(_FIELD_KEYWORDS)
+
+
+# Required booking fields, one bit each, in the order they are asked for
+_REQUIRED_FIELD_BITS = {
+    'service_type': 1,
+    'date': 2,
+    'time': 4,
+    'customer_name': 8,
+    'email': 16
+}
+_BIT_TO_REQUIRED_FIELD = {bit: field for field, bit in _REQUIRED_FIELD_BITS.items()}
+_ALL_REQUIRED_FILLED = 0b11111
+
+
+def _filled_mask(appointment_data: Dict[str, Any]) -> int:
+    """Bitmask of the required fields that currently hold a value."""
+    mask = 0
+    for field, bit in _REQUIRED_FIELD_BITS.items():
+        if appointment_data.get(field):
+            mask |= bit
+    return mask
+
+
+def _preferences_captured_response(appointment_data: Dict[str, Any]) -> str:
+    return f"""✅ **Excellent! I've captured all your preferences:**
+
+• **Service:** {appointment_data.get('service_type', '').title()}
+• **Date:** {appointment_data.get('date', '')}
+• **Time:** {appointment_data.get('time', '')}
+
+**Now I just need your name and email to complete the booking.**
+What's your full name? (e.g., John Smith)"""
+
+
+def _ask_time_response(appointment_data: Dict[str, Any]) -> str:
+    date_value = appointment_data.get('date', '')
+    return f"""✅ **Perfect! I have your:**
+• **Service:** {appointment_data.get('service_type', '').title()}  
+• **Date:** {date_value}
+
+**What time on {date_value} works best for you?**"""
+
+
+def _ask_email_response(appointment_data: Dict[str, Any]) -> str:
+    customer_name = appointment_data.get('customer_name', '')
+    return f"""✅ **Almost done, {customer_name}!**
+
+I have:
+• **Service:** {appointment_data.get('service_type', '').title()}
+• **Date:** {appointment_data.get('date', '')}
+• **Time:** {appointment_data.get('time', '')}
+• **Name:** {customer_name}
+
+**One last step: Please provide your email address for confirmation.**
+Example: name@example.com"""
+
+
+# (service/date/time/name bits, next question) -> response template
+_SMART_RESPONSES: Dict[Tuple[int, str], Callable[[Dict[str, Any]], str]] = {
+    (0b0111, 'customer_name'): _preferences_captured_response,
+    (0b1111, 'customer_name'): _preferences_captured_response,
+    (0b0011, 'time'): _ask_time_response,
+    (0b1011, 'time'): _ask_time_response,
+    (0b1111, 'email'): _ask_email_response,
+}
 
 
 class AppointmentFlow:
@@ -19,14 +148,25 @@ class AppointmentFlow:
     def __init__(self, appointment_service):
         self.appointment_service = appointment_service
         self.parser = DateTimeParser()
+        
+        # Parsed results are reused for repeated inputs; relative dates
+        # ("today", "next friday") are keyed by today's ordinal as well.
+        self._parse_date_cached = lru_cache(maxsize=2048)(
+            lambda text, today_ordinal: self.parser.parse_date(text)
+        )
+        self._parse_time_cached = lru_cache(maxsize=2048)(self.parser.parse_time)
     
-    def handle_flow(self, user_id: str, message: str, conv_state: Dict[str, Any], 
+    def _parse_date(self, text: str) -> Optional[str]:
+        """Parse a date, reusing the result for the same text on the same day."""
+        return self._parse_date_cached(text, date.today().toordinal())
+    
+    def handle_flow(self, user_id: str, message: str, conv_state: ConversationState, 
                intent_details: Dict[str, Any]) -> Dict[str, Any]:
         """Handle appointment flow logic."""
-        appointment_data = conv_state['appointment_data']
-        current_question = conv_state.get('current_question')
+        appointment_data = conv_state.appointment_data
+        current_question = conv_state.current_question
         
-        logger.info(f"Appointment flow - Current question: {current_question}")
+        logger.debug("Appointment flow - Current question: {}", current_question)
         
         # Extract information from message
         extracted_info = self._extract_appointment_info(message, intent_details)
@@ -35,7 +175,7 @@ class AppointmentFlow:
         for key, value in extracted_info.items():
             if value:
                 appointment_data[key] = value
-                logger.info(f"✅ Updated {key}: {value}")
+                logger.debug("✅ Updated {}: {}", key, value)
         
         # Validate extracted data
         validation_result = self._validate_extracted_data(appointment_data)
@@ -44,11 +184,11 @@ class AppointmentFlow:
         
         # Handle current question or determine next
         if not current_question:
-            if conv_state.get('appointment_flow') == 'modifying':
+            if conv_state.appointment_flow == 'modifying':
                 return self._handle_modification_request(message, conv_state)
             else:
                 needed_info = self._get_next_appointment_info(appointment_data)
-                conv_state['current_question'] = needed_info
+                conv_state.current_question = needed_info
                 return self._ask_appointment_question(needed_info, appointment_data)
         
         # Check if current question was just answered 
@@ -88,39 +228,23 @@ class AppointmentFlow:
         if current_question == 'customer_name' and message.strip() and not current_question_answered:
             message_lower = message.lower().strip()
             
-            # List of words that are NOT names
-            not_names = [
-                'today', 'tomorrow', 'yesterday', 'morning', 'afternoon', 'evening',
-                'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday',
-                'january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
-                'september', 'october', 'november', 'december',
-                'am', 'pm', 'noon', 'midnight',
-                '1', '2', '3', '4', '5', '6', '7', '8', '9', '0'
-            ]
-            
-            # Check if it's NOT a date/time word and not just a number
-            is_not_name = any(word in message_lower for word in not_names) or re.match(r'^\d+$', message_lower)
+            # Check if it's NOT a date/time word and contains no digits
+            is_not_name = (not _DATE_TIME_WORDS.isdisjoint(_WORD_RE.findall(message_lower))
+                           or _DIGIT_RE.search(message_lower))
             
             if not is_not_name and len(message.strip()) >= 2:
                 appointment_data['customer_name'] = message.strip().title()
                 current_question_answered = True
-                logger.info(f"✅ Accepted as name: {message}")
+                logger.debug("✅ Accepted as name: {}", message)
         
         # Move to next question if current was answered
         if current_question_answered:
             # Check if all required info is collected
             if self._has_all_required_info(appointment_data):
-                conv_state['current_question'] = None
-                conv_state['waiting_for_confirmation'] = True
-                
-                if conv_state.get('modifying_existing_appointment'):
-                    appointment_id = conv_state.get('existing_appointment_id')
-                    return self._show_modification_confirmation(appointment_data, appointment_id)
-                else:
-                    return self._show_confirmation(appointment_data)
+                return self.show_confirmation(user_id, conv_state)
             else:
                 next_question = self._get_next_appointment_info(appointment_data)
-                conv_state['current_question'] = next_question
+                conv_state.current_question = next_question
                 return self._generate_smart_response(appointment_data, next_question)
         
         # If no extraction for current question, ask again
@@ -130,70 +254,50 @@ class AppointmentFlow:
         """Extract appointment information from message."""
         extracted = {}
         entities = intent_details.get('entities', {})
+        message_lower = message.lower().strip()
         
         # Extract service type
         if 'service_type' in entities:
             extracted['service_type'] = entities['service_type'][0]
         else:
-            service_type = self._extract_service_type_from_text(message)
+            service_type = first_keyword_match(_SERVICE_SCANNER, message_lower)
             if service_type:
                 extracted['service_type'] = service_type
         
         # Extract date FIRST 
-        parsed_date = self.parser.parse_date(message)
+        parsed_date = self._parse_date(message)
         if parsed_date:
             extracted['date'] = parsed_date
-            logger.info(f"✅ Parsed date: {parsed_date}")
+            logger.debug("✅ Parsed date: {}", parsed_date)
         elif 'date' in entities:
             # Entity extractor might have extracted "next sunday" as a date
-            parsed_date = self.parser.parse_date(entities['date'][0])
+            parsed_date = self._parse_date(entities['date'][0])
             if parsed_date:
                 extracted['date'] = parsed_date
-                logger.info(f"✅ Parsed date from entity: {parsed_date}")
+                logger.debug("✅ Parsed date from entity: {}", parsed_date)
         
         # Extract time
-        parsed_time = self.parser.parse_time(message)
+        parsed_time = self._parse_time_cached(message)
         if parsed_time:
             extracted['time'] = parsed_time
-            logger.info(f"✅ Parsed time: {parsed_time}")
+            logger.debug("✅ Parsed time: {}", parsed_time)
         elif 'time' in entities:
             for entity_time in entities['time']:
-                parsed_time = self.parser.parse_time(entity_time)
+                parsed_time = self._parse_time_cached(entity_time)
                 if parsed_time:
                     extracted['time'] = parsed_time
-                    logger.info(f"✅ Parsed time from entity: {parsed_time}")
+                    logger.debug("✅ Parsed time from entity: {}", parsed_time)
                     break
         
         # NAME EXTRACTION 
         # Only extract name if it's NOT a date/time word
-        message_lower = message.lower().strip()
-        
-        # List of common date/time words that should NOT be extracted as names
-        date_time_words = [
-            'today', 'tomorrow', 'yesterday', 'morning', 'afternoon', 'evening',
-            'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday',
-            'january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
-            'september', 'october', 'november', 'december',
-            'am', 'pm', 'noon', 'midnight'
-        ]
-        
-        # Check if message contains date/time words
-        is_date_time = any(word in message_lower for word in date_time_words)
+        is_date_time = not _DATE_TIME_WORDS.isdisjoint(_WORD_RE.findall(message_lower))
         
-        if not is_date_time:
-            # Extract name - check multiple patterns
-            name_patterns = [
-                r'my name is\s+([A-Za-z\s]{2,})',
-                r'i am\s+([A-Za-z\s]{2,})',
-                r'i\'m\s+([A-Za-z\s]{2,})',
-                r'call me\s+([A-Za-z\s]{2,})',
-                r'this is\s+([A-Za-z\s]{2,})',
-                r'name\s+is\s+([A-Za-z\s]{2,})',
-                r'^([A-Za-z]{2,}\s+[A-Za-z]{2,})$'  # First Last only if not date/time
-            ]
-            
-            for pattern in name_patterns:
-                match = re.search(pattern, message.strip(), re.IGNORECASE)
+        message_stripped = message.strip()
+        if not is_date_time and _NAME_UNION_RE.search(message_stripped):
+            # Extract name - patterns are tried in priority order, not by position
+            for pattern in _NAME_PATTERNS:
+                match = pattern.search(message_stripped)
                 if match:
                     # Get the name group
                     if len(match.groups()) > 0:
@@ -202,42 +306,28 @@ class AppointmentFlow:
                         name = match.group(0).strip()
                     
                     # Clean up the name
-                    name = re.sub(r'\s+', ' ', name)  # Remove extra spaces
+                    name = _WS_RE.sub(' ', name)  # Remove extra spaces
                     name = name.title()  # Capitalize properly
                     
                     # Additional check: name should not be a single common word
-                    common_words = ['hi', 'hello', 'hey', 'ok', 'yes', 'no', 'thanks', 'thank']
                     if (2 <= len(name) <= 50 and 
-                        name.lower() not in common_words and
+                        name.lower() not in _COMMON_WORDS and
                         len(name.split()) <= 3):  # Max 3 words for a name
                         extracted['customer_name'] = name
-                        logger.info(f"✅ Extracted valid name: {name}")
+                        logger.debug("✅ Extracted valid name: {}", name)
                         break
         
         # Extract email
-        email_match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', message)
+        email_match = _EMAIL_RE.search(message)
         if email_match:
             extracted['email'] = email_match.group()
         
-        logger.info(f"🔍 Extracted info: {extracted}")
+        logger.debug("🔍 Extracted info: {}", extracted)
         return extracted
     
     def _extract_service_type_from_text(self, text: str) -> Optional[str]:
         """Extract service type from text."""
-        text_lower = text.lower()
-        
-        for service, keywords in [
-            ('consultation', ['consultation', 'consult', 'advice', 'guidance']),
-            ('support', ['support', 'help', 'assistance', 'fix', 'issue']),
-            ('installation', ['installation', 'install', 'setup', 'implement']),
-            ('maintenance', ['maintenance', 'maintain', 'service', 'checkup']),
-            ('training', ['training', 'train', 'learn', 'teach', 'educate']),
-            ('demo', ['demo', 'demonstration', 'show', 'presentation'])  
-        ]:
-            if any(keyword in text_lower for keyword in keywords):
-                return service
-        
-        return None
+        return first_keyword_match(_SERVICE_SCANNER, text.lower())
     
     def _validate_extracted_data(self, appointment_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Validate extracted appointment data."""
@@ -267,16 +357,16 @@ class AppointmentFlow:
         
         return None
     
-    def _handle_modification_request(self, message: str, conv_state: Dict[str, Any]) -> Dict[str, Any]:
+    def _handle_modification_request(self, message: str, conv_state: ConversationState) -> Dict[str, Any]:
         """Handle appointment modification request."""
         field_to_change = self._detect_field_to_change(message)
         
         if field_to_change:
             # Clear the field for update
-            if field_to_change in conv_state['appointment_data']:
-                conv_state['appointment_data'][field_to_change] = ''
+            if field_to_change in conv_state.appointment_data:
+                conv_state.appointment_data[field_to_change] = ''
             
-            conv_state['current_question'] = field_to_change
+            conv_state.current_question = field_to_change
             
             if field_to_change == 'service_type':
                 response_text = """🔧 **Change Service Type**
@@ -291,7 +381,7 @@ What type of service would you like instead?
 
 Please indicate your choice by number or name."""
             else:
-                response_text = ResponseTemplates.appointment_question(field_to_change, conv_state['appointment_data'])
+                response_text = ResponseTemplates.appointment_question(field_to_change, conv_state.appointment_data)
             
             return {
                 'response': response_text,
@@ -309,47 +399,16 @@ Please indicate your choice by number or name."""
     
     def _detect_field_to_change(self, message: str) -> Optional[str]:
         """Detect which field user wants to change."""
-        message_lower = message.lower()
-        
-        field_map = {
-            'service': 'service_type',
-            'service type': 'service_type',
-            'type': 'service_type',
-            'date': 'date',
-            'day': 'date',
-            'time': 'time',
-            'hour': 'time',
-            'schedule': 'time',
-            'name': 'customer_name',
-            'email': 'email',
-            'contact': 'email'
-        }
-        
-        for keyword, field in field_map.items():
-            if keyword in message_lower:
-                return field
-        
-        return None
+        return first_keyword_match(_FIELD_SCANNER, message.lower())
     
     def _has_all_required_info(self, appointment_data: Dict[str, Any]) -> bool:
         """Check if all required appointment info is collected."""
-        required_fields = ['service_type', 'date', 'time', 'customer_name', 'email']
-        return all(field in appointment_data and appointment_data[field] for field in required_fields)
+        return _filled_mask(appointment_data) == _ALL_REQUIRED_FILLED
     
     def _get_next_appointment_info(self, appointment_data: Dict[str, Any]) -> str:
         """Determine what information is needed next."""
-        if 'service_type' not in appointment_data or not appointment_data['service_type']:
-            return 'service_type'
-        elif 'date' not in appointment_data or not appointment_data['date']:
-            return 'date'
-        elif 'time' not in appointment_data or not appointment_data['time']:
-            return 'time'
-        elif 'customer_name' not in appointment_data or not appointment_data['customer_name']:
-            return 'customer_name'
-        elif 'email' not in appointment_data or not appointment_data['email']:
-            return 'email'
-        else:
-            return 'complete'
+        missing = ~_filled_mask(appointment_data) & _ALL_REQUIRED_FILLED
+        return _BIT_TO_REQUIRED_FIELD.get(lowest_bit(missing), 'complete')
     
     def _ask_appointment_question(self, question_type: str, appointment_data: Dict[str, Any]) -> Dict[str, Any]:
         """Ask for appointment information."""
@@ -407,51 +466,51 @@ I have your:
     
     def _generate_smart_response(self, appointment_data: Dict[str, Any], next_question: str) -> Dict[str, Any]:
         """Generate intelligent response based on collected info."""
-        service_type = appointment_data.get('service_type', '').title()
-        date_value = appointment_data.get('date', '')
-        time_value = appointment_data.get('time', '')
-        
-        has_service = 'service_type' in appointment_data and appointment_data['service_type']
-        has_date = 'date' in appointment_data and appointment_data['date']
-        has_time = 'time' in appointment_data and appointment_data['time']
-        has_name = 'customer_name' in appointment_data and appointment_data['customer_name']
-        
-        # Generate appropriate response based on what we have
-        if has_service and has_date and has_time and next_question == 'customer_name':
-            response_text = f"""✅ **Excellent! I've captured all your preferences:**
-
-• **Service:** {service_type}
-• **Date:** {date_value}
-• **Time:** {time_value}
-
-**Now I just need your name and email to complete the booking.**
-What's your full name? (e.g., John Smith)"""
+        # Pick the template from what we have (service/date/time/name bits) and what we ask next
+        bits = _filled_mask(appointment_data) & 0b1111
+        template = _SMART_RESPONSES.get((bits, next_question))
+        if template is None:
+            return self._ask_appointment_question(next_question, appointment_data)
         
-        elif has_service and has_date and not has_time and next_question == 'time':
-            response_text = f"""✅ **Perfect! I have your:**
-• **Service:** {service_type}  
-• **Date:** {date_value}
-
-**What time on {date_value} works best for you?**"""
+        return {
+            'response': template(appointment_data),
+            'intent': 'action',
+            'needs_escalation': False,
+            'action_required': True
+        }
+    
+    def show_confirmation(self, user_id: str, conv_state: ConversationState) -> Dict[str, Any]:
+        """Hold the requested slot and ask for confirmation, or re-ask the time if it is taken."""
+        appointment_data = conv_state.appointment_data
+        appointment_id = conv_state.existing_appointment_id if conv_state.modifying_existing_appointment else None
         
-        elif has_service and has_date and has_time and has_name and next_question == 'email':
-            customer_name = appointment_data.get('customer_name', '')
-            response_text = f"""✅ **Almost done, {customer_name}!**
-
-I have:
-• **Service:** {service_type}
-• **Date:** {date_value}
-• **Time:** {time_value}
-• **Name:** {customer_name}
-
-**One last step: Please provide your email address for confirmation.**
-Example: name@example.com"""
+        if not self.appointment_service.reserve_slot(appointment_data.get('date'), appointment_data.get('time'),
+                                                     user_id, ignore_appointment_id=appointment_id):
+            return self.slot_taken_response(conv_state)
         
-        else:
-            return self._ask_appointment_question(next_question, appointment_data)
+        conv_state.current_question = None
+        conv_state.waiting_for_confirmation = True
         
+        if appointment_id:
+            return self._show_modification_confirmation(appointment_data, appointment_id)
+        return self._show_confirmation(appointment_data)
+    
+    def slot_taken_response(self, conv_state: ConversationState) -> Dict[str, Any]:
+        """Drop the unavailable time and ask the user for another one."""
+        appointment_data = conv_state.appointment_data
+        date_str = appointment_data.get('date', '')
+        taken_time = appointment_data.pop('time', '')
+        conv_state.current_question = 'time'
+        conv_state.waiting_for_confirmation = False
+        conv_state.confirmation_reprompt = None
+        
+        available = self.appointment_service.get_available_times(date_str)
+        logger.info("⛔ Slot {} {} unavailable, asking for another time", date_str, taken_time)
         return {
-            'response': response_text,
+            'response': _SLOT_TAKEN_MSG.format(
+                time=taken_time, date=date_str,
+                available=f"\n\nAvailable times that day: {', '.join(available)}" if available else ""
+            ),
             'intent': 'action',
             'needs_escalation': False,
             'action_required': True
@@ -3,24 +3,93 @@ Appointment service handling all appointment-related business logic.
 Separated from dialog management for better maintainability.
 """
 
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple, Any
-import uuid
-import re
+from secrets import token_hex
 from loguru import logger
 
 from app.config.business_rules import BUSINESS_HOURS, VALID_SERVICES, APPOINTMENT_SLOTS
 
+# Business-hour bounds are static config; resolve them once at import
+_START_HOUR = BUSINESS_HOURS['start'].hour
+_END_HOUR = BUSINESS_HOURS['end'].hour
+_START_STR = BUSINESS_HOURS['start'].strftime('%I:%M %p')
+_END_STR = BUSINESS_HOURS['end'].strftime('%I:%M %p')
+
+# Appointments start on the hour or half hour only
+_VALID_MINUTES = frozenset({0, 30})
+
+_WEEKEND = frozenset({5, 6})
+
+# Weekend rejection messages by weekday(); only the date varies per call
+_WEEKEND_MSG = {
+    weekday: (
+        "❌ **Weekend Appointment:** We're closed on weekends!\n\n"
+        f"You selected **{day_name} ({{}})**.\n\n"
+        "📅 **Please choose a weekday (Monday-Friday):**"
+    )
+    for weekday, day_name in ((5, 'Saturday'), (6, 'Sunday'))
+}
+
+# How long a slot stays held for a user reviewing the confirmation (seconds)
+SLOT_HOLD_SECONDS = 120
+
+# Accepted appointment time formats, tried in order ('2:30 PM', '2:30PM', '14:30')
+_TIME_FORMATS = ('%I:%M %p', '%I:%M%p', '%H:%M')
+
+
+def _parse_time_of_day(time_str: str) -> Optional[datetime]:
+    """Parse an appointment time string, or return None if no format matches."""
+    # Every accepted format has a colon; reject anything else before strptime
+    if ':' not in time_str:
+        return None
+    normalized = time_str.strip().upper()
+    for fmt in _TIME_FORMATS:
+        try:
+            return datetime.strptime(normalized, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _weekday(date_str: str) -> int:
+    """Return the weekday (Monday=0) of a YYYY-MM-DD date.
+    
+    The format is fixed, so slice the fields instead of going through strptime;
+    repeated dates (today, tomorrow) hit the cache.
+    """
+    if len(date_str) != 10 or date_str[4] != '-' or date_str[7] != '-':
+        raise ValueError(f"date {date_str!r} does not match format '%Y-%m-%d'")
+    return date(int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10])).weekday()
+
 
 class AppointmentService:
     """Service for managing appointments."""
     
     def __init__(self):
-        self.appointments: List[Dict] = []
+        # Appointments keyed by appointment_id (insertion-ordered)
+        self.appointments: Dict[str, Dict] = {}
+        # Secondary index: user_id -> that user's appointments
+        self._by_user: Dict[str, List[Dict]] = defaultdict(list)
+        # Booked slot counts per date: date_str -> Counter({time_str: n})
+        self._booked_by_date: Dict[str, Counter] = defaultdict(Counter)
+        # Slots held during confirmation: (date, time) -> (user_id, expires_at monotonic)
+        self._holds: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        # Reverse index: user_id -> the one slot that user holds
+        self._hold_by_user: Dict[str, Tuple[str, str]] = {}
+        # Guards the store and its indexes across compound updates
+        self._lock = threading.RLock()
     
     def create_appointment(self, user_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new appointment."""
-        appointment_id = self._generate_appointment_id()
+        now = datetime.now()
+        now_iso = now.isoformat()
+        appointment_id = self._generate_appointment_id(now)
         
         appointment = {
             'appointment_id': appointment_id,
@@ -31,106 +100,182 @@ class AppointmentService:
             'customer_name': data.get('customer_name'),
             'email': data.get('email'),
             'status': 'confirmed',
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
+            'created_at': now_iso,
+            'updated_at': now_iso
         }
         
-        self.appointments.append(appointment)
-        logger.info(f"✅ Appointment created: {appointment_id} for user {user_id}")
+        with self._lock:
+            self.appointments[appointment_id] = appointment
+            self._by_user[user_id].append(appointment)
+            self._book_slot(appointment)
+        logger.info("✅ Appointment created: {} for user {}", appointment_id, user_id)
         return appointment
     
     def update_appointment(self, appointment_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update an existing appointment."""
-        for appointment in self.appointments:
-            if appointment['appointment_id'] == appointment_id:
-                appointment.update(updates)
-                appointment['updated_at'] = datetime.now().isoformat()
-                appointment['status'] = 'updated'
-                logger.info(f"🔄 Appointment updated: {appointment_id}")
-                return appointment
-        logger.warning(f"❌ Appointment not found: {appointment_id}")
-        return None
+        with self._lock:
+            appointment = self.appointments.get(appointment_id)
+            if appointment is None:
+                logger.warning("❌ Appointment not found: {}", appointment_id)
+                return None
+            if appointment['status'] == 'cancelled':
+                logger.warning("❌ Appointment already cancelled: {}", appointment_id)
+                return None
+            
+            self._release_slot(appointment)
+            appointment.update(updates)
+            self._book_slot(appointment)
+            appointment['updated_at'] = datetime.now().isoformat()
+            appointment['status'] = 'updated'
+        logger.info("🔄 Appointment updated: {}", appointment_id)
+        return appointment
+    
+    def cancel_appointment(self, appointment_id: str) -> Optional[Dict[str, Any]]:
+        """Mark an appointment cancelled."""
+        with self._lock:
+            appointment = self.appointments.get(appointment_id)
+            if appointment is None:
+                return None
+            # A repeated cancel must not free the slot twice
+            if appointment['status'] != 'cancelled':
+                self._release_slot(appointment)
+            appointment['status'] = 'cancelled'
+            appointment['updated_at'] = datetime.now().isoformat()
+        logger.info("🗑️ Appointment cancelled: {}", appointment_id)
+        return appointment
+    
+    def get_all_appointments(self) -> List[Dict[str, Any]]:
+        """Get all appointments (snapshot taken under the store lock)."""
+        with self._lock:
+            return list(self.appointments.values())
     
     def get_user_appointments(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all appointments for a user."""
-        return [apt for apt in self.appointments if apt['user_id'] == user_id]
+        with self._lock:
+            return list(self._by_user.get(user_id, ()))
     
     def get_appointment_by_id(self, appointment_id: str) -> Optional[Dict[str, Any]]:
         """Get appointment by ID."""
-        for appointment in self.appointments:
-            if appointment['appointment_id'] == appointment_id:
-                return appointment
-        return None
+        return self.appointments.get(appointment_id)
     
     def validate_appointment(self, date_str: str, time_str: str) -> Tuple[bool, str]:
         """Validate appointment date and time."""
         try:
-            # Validate date
-            appointment_date = datetime.strptime(date_str, '%Y-%m-%d')
-            weekday = appointment_date.weekday()
-            
-            # Check if it's a weekend
-            if weekday >= 5:
-                day_name = appointment_date.strftime('%A')
-                return False, f"❌ **Weekend Appointment:** We're closed on weekends!\n\nYou selected **{day_name} ({date_str})**.\n\n📅 **Please choose a weekday (Monday-Friday):**"
+            # Validate date - check if it's a weekend
+            weekend_error = self._check_weekday(date_str)
+            if weekend_error:
+                return False, weekend_error
             
             # Validate time
-            time_match = re.search(r'(\d{1,2}):(\d{2})\s*(AM|PM)', time_str, re.IGNORECASE)
-            if not time_match:
+            parsed_time = _parse_time_of_day(time_str)
+            if parsed_time is None:
                 return False, "I couldn't understand the time format. Please use formats like '2:30 PM' or '14:30'."
             
-            hour = int(time_match.group(1))
-            minute = int(time_match.group(2))
-            am_pm = time_match.group(3).upper()
-            
-            # Convert to 24-hour format
-            if am_pm == 'PM' and hour != 12:
-                hour += 12
-            elif am_pm == 'AM' and hour == 12:
-                hour = 0
+            hour, minute = parsed_time.hour, parsed_time.minute
             
             # Check business hours
-            start_hour = BUSINESS_HOURS['start'].hour
-            end_hour = BUSINESS_HOURS['end'].hour
-            
-            if hour < start_hour:  # Before start time
-                start_time_str = BUSINESS_HOURS['start'].strftime('%I:%M %p')
-                return False, f"❌ **Outside Business Hours:** Our appointments start at **{start_time_str}**.\n\nYou selected **{time_str}**."
+            if hour < _START_HOUR:  # Before start time
+                return False, f"❌ **Outside Business Hours:** Our appointments start at **{_START_STR}**.\n\nYou selected **{time_str}**."
             
-            if hour >= end_hour:  # At or after end time
-                end_time_str = BUSINESS_HOURS['end'].strftime('%I:%M %p')
-                return False, f"❌ **Outside Business Hours:** Our last appointments are at **{end_time_str}**.\n\nYou selected **{time_str}**."
+            if hour >= _END_HOUR:  # At or after end time
+                return False, f"❌ **Outside Business Hours:** Our last appointments are at **{_END_STR}**.\n\nYou selected **{time_str}**."
             
             # Check minutes - appointments on hour or half hour only
-            if minute not in [0, 30]:
+            if minute not in _VALID_MINUTES:
                 return False, "We schedule appointments on the hour or half hour only. Please choose a time like '2:00 PM' or '2:30 PM'."
             
             return True, "Appointment time is valid."
             
         except ValueError as e:
-            logger.error(f"Validation error: {e}")
-            return False, f"I couldn't validate your appointment time. Please try a different format."
+            logger.error("Validation error: {}", e)
+            return False, "I couldn't validate your appointment time. Please try a different format."
     
     def validate_date(self, date_str: str) -> Tuple[bool, str]:
         """Validate if date is a weekday."""
         try:
-            appointment_date = datetime.strptime(date_str, '%Y-%m-%d')
-            weekday = appointment_date.weekday()
-            
-            if weekday >= 5:
-                day_name = appointment_date.strftime('%A')
-                return False, f"❌ **Weekend Appointment:** We're closed on weekends!\n\nYou selected **{day_name} ({date_str})**.\n\n📅 **Please choose a weekday (Monday-Friday):**"
+            weekend_error = self._check_weekday(date_str)
+            if weekend_error:
+                return False, weekend_error
             
             return True, "Date is valid."
         except ValueError as e:
-            logger.error(f"Date validation error: {e}")
-            return False, f"I couldn't understand the date format. Please use YYYY-MM-DD format."
+            logger.error("Date validation error: {}", e)
+            return False, "I couldn't understand the date format. Please use YYYY-MM-DD format."
+    
+    def _check_weekday(self, date_str: str) -> Optional[str]:
+        """Return the weekend rejection message for date_str, or None on a weekday.
+        
+        Raises ValueError if date_str is not YYYY-MM-DD.
+        """
+        weekday = _weekday(date_str)
+        if weekday in _WEEKEND:
+            return _WEEKEND_MSG[weekday].format(date_str)
+        return None
     
     def get_available_times(self, date_str: str) -> List[str]:
         """Get available time slots for a date."""
-        # For now, return all slots. In production, check against existing appointments.
-        return APPOINTMENT_SLOTS
+        now = time.monotonic()
+        with self._lock:
+            booked = self._booked_by_date.get(date_str)
+            if not booked and not self._holds:
+                return list(APPOINTMENT_SLOTS)
+            return [
+                slot for slot in APPOINTMENT_SLOTS
+                if not (booked and booked[slot]) and self._holds.get((date_str, slot), (None, 0.0))[1] <= now
+            ]
+    
+    def reserve_slot(self, date_str: str, time_str: str, user_id: str,
+                     ttl_seconds: float = SLOT_HOLD_SECONDS,
+                     ignore_appointment_id: Optional[str] = None) -> bool:
+        """Hold a date/time slot for user_id while they confirm.
+        
+        Fails if another user holds the slot or it is already booked; the
+        booking ignore_appointment_id (the one being modified) does not count.
+        A user holds one slot at a time, so this replaces any earlier hold.
+        """
+        slot = (date_str, time_str)
+        now = time.monotonic()
+        with self._lock:
+            holder = self._holds.get(slot)
+            if holder and holder[0] != user_id and holder[1] > now:
+                return False
+            
+            booked = self._booked_by_date.get(date_str)
+            taken = booked[time_str] if booked else 0
+            if taken and ignore_appointment_id:
+                own = self.appointments.get(ignore_appointment_id)
+                if own and own.get('date') == date_str and own.get('time') == time_str:
+                    taken -= 1
+            if taken > 0:
+                return False
+            
+            self._release_hold(user_id)
+            self._holds[slot] = (user_id, now + ttl_seconds)
+            self._hold_by_user[user_id] = slot
+        return True
+    
+    def release_slot(self, user_id: str):
+        """Drop the slot hold of user_id, if any."""
+        with self._lock:
+            self._release_hold(user_id)
+    
+    def _release_hold(self, user_id: str):
+        slot = self._hold_by_user.pop(user_id, None)
+        if slot is not None and self._holds.get(slot, (None,))[0] == user_id:
+            del self._holds[slot]
+    
+    def _book_slot(self, appointment: Dict[str, Any]):
+        """Count the appointment's date/time slot as taken."""
+        if appointment.get('date') and appointment.get('time'):
+            self._booked_by_date[appointment['date']][appointment['time']] += 1
+    
+    def _release_slot(self, appointment: Dict[str, Any]):
+        """Free one booking of the appointment's date/time slot."""
+        booked = self._booked_by_date.get(appointment.get('date'))
+        if booked and booked[appointment.get('time')] > 0:
+            booked[appointment['time']] -= 1
     
-    def _generate_appointment_id(self) -> str:
+    def _generate_appointment_id(self, now: Optional[datetime] = None) -> str:
         """Generate unique appointment ID."""
-        return f"APT-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
\ No newline at end of file
+        now = now or datetime.now()
+        return f"APT-{now.strftime('%Y%m%d')}-{token_hex(4).upper()}"
\ No newline at end of file
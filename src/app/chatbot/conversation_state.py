@@ -0,0 +1,76 @@
+"""
+Per-user conversation state records.
+Shared by the dialog manager and the appointment flow.
+"""
+
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Any
+
+# Turns kept per conversation; older turns drop off the front
+MAX_HISTORY_TURNS = 100
+
+
+def format_timestamp_ns(ns: int) -> str:
+    """Render a time.time_ns() value as a local ISO-8601 timestamp."""
+    return datetime.fromtimestamp(ns / 1e9).isoformat()
+
+
+@dataclass(slots=True, frozen=True)
+class HistoryEntry:
+    """One conversation turn (PII already masked)."""
+    user: str
+    bot: str
+    timestamp_ns: int
+    intent: str
+    needs_escalation: bool
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for API payloads, with an ISO timestamp."""
+        return {
+            'user': self.user,
+            'bot': self.bot,
+            'timestamp': format_timestamp_ns(self.timestamp_ns),
+            'intent': self.intent,
+            'needs_escalation': self.needs_escalation
+        }
+
+
+@dataclass(slots=True)
+class ConversationState:
+    """Mutable state for one user's conversation."""
+    history: Deque[HistoryEntry] = field(default_factory=lambda: deque(maxlen=MAX_HISTORY_TURNS))
+    context: Dict[str, Any] = field(default_factory=dict)
+    appointment_flow: Optional[str] = None
+    appointment_data: Dict[str, Any] = field(default_factory=dict)
+    current_question: Optional[str] = None
+    waiting_for_confirmation: bool = False
+    start_time_ns: int = field(default_factory=time.time_ns)
+    message_count: int = 0
+    last_intent: Optional[str] = None
+    demo_flow: bool = False
+    last_menu: Optional[str] = None
+    modifying_existing_appointment: bool = False
+    existing_appointment_id: Optional[str] = None
+    failure_reasons: List[str] = field(default_factory=list)
+    last_escalation_check: Optional[str] = None
+    bot_mentioned_appointment: bool = False
+    # Set while the user picks which of several appointments to change
+    pending_appointment_selection: bool = False
+    available_appointments: Optional[List[Dict[str, Any]]] = None
+    # Rendered confirmation re-prompt, valid until the user answers yes/no
+    confirmation_reprompt: Optional[str] = None
+    
+    def reset_appointment(self):
+        """Clear all appointment booking / modification state."""
+        self.appointment_flow = None
+        self.appointment_data = {}
+        self.current_question = None
+        self.waiting_for_confirmation = False
+        self.modifying_existing_appointment = False
+        self.existing_appointment_id = None
+        self.pending_appointment_selection = False
+        self.available_appointments = None
+        self.confirmation_reprompt = None
@@ -3,10 +3,15 @@ Refactored Dialog Manager - Main orchestrator.
 Now delegates to specialized services and handlers.
 """
 
+from collections import OrderedDict, deque
+from functools import lru_cache
+from itertools import islice
 from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
 import uuid
 import re
+import queue
+import threading
+import time
 from loguru import logger
 
 from app.chatbot.intent_classifier import IntentClassifier
@@ -14,6 +19,7 @@ from app.chatbot.rag_engine import RAGEngine
 from app.chatbot.nlp_processor import NLPProcessor
 from app.chatbot.api_client import APIClient
 from app.utils.security import SecurityManager
+from app.utils.email_sender import email_sender
 from app.config.settings import settings
 from app.knowledge_base.loader import KnowledgeBaseLoader
 
@@ -22,9 +28,185 @@ from app.config.business_rules import BUSINESS_HOURS, VALID_SERVICES
 from app.config.response_templates import ResponseTemplates
 from app.chatbot.appointment_service import AppointmentService
 from app.chatbot.knowledge_service import KnowledgeService
+from app.chatbot.semantic_cache import SemanticCache
 from app.chatbot.intent_handlers import IntentHandlers
 from app.chatbot.appointment_flow import AppointmentFlow
 from app.chatbot.escalation_handler import EscalationHandler
+from app.chatbot.conversation_state import ConversationState, HistoryEntry
+from app.utils.keyword_scanner import build_keyword_scanner, scan_keywords, lowest_bit
+
+
+# Demo product keywords: any product word in user text, full product names in bot text
+_USER_PRODUCT_WORDS = {
+    'enterprise': 'enterprise_suite', 'suite': 'enterprise_suite',
+    'analytics': 'analytics_pro', 'cloud': 'cloud_services'
+}
+_BOT_PRODUCT_NAMES = {
+    'enterprise suite': 'enterprise_suite', 'analytics pro': 'analytics_pro',
+    'cloud services': 'cloud_services'
+}
+_USER_PRODUCT_RE = re.compile('|'.join(_USER_PRODUCT_WORDS), re.IGNORECASE)
+_BOT_PRODUCT_RE = re.compile('|'.join(_BOT_PRODUCT_NAMES), re.IGNORECASE)
+_DEMO_PRODUCT_PRIORITY = ('enterprise_suite', 'analytics_pro', 'cloud_services')
+
+
+def _mentioned_product(pattern: re.Pattern, keyword_map: Dict[str, str], text: str) -> Optional[str]:
+    """Return the highest-priority product mentioned in text, if any."""
+    found = {keyword_map[match.lower()] for match in pattern.findall(text)}
+    if not found:
+        return None
+    return next(product for product in _DEMO_PRODUCT_PRIORITY if product in found)
+
+
+def _tail(history: deque, n: int) -> list:
+    """Return the last n entries of a history deque as a list."""
+    return list(islice(history, max(0, len(history) - n), None))
+
+
+# Response templates, formatted per call
+_DEMO_PRODUCT_DISPLAY = {
+    'enterprise_suite': 'COB Enterprise Suite',
+    'analytics_pro': 'COB Analytics Pro',
+    'cloud_services': 'COB Cloud Services',
+    'general': 'our products'
+}
+
+_DEMO_TEMPLATE = """🎥 **Schedule a {product} Demo**
+
+        I'd be happy to schedule a demo of {product} for you!
+
+        **When would you like to schedule your demo?**
+
+        Please provide a date:
+        • Today/Tomorrow
+        • Next Monday/Tuesday/etc.
+        • Specific date like December 15
+        • Day of week like Friday"""
+
+_MODIFICATION_TEMPLATE = """🔄 **Modifying Appointment** (ID: {appointment_id})
+
+Here are your current appointment details:
+{details}
+
+**What would you like to change?**
+You can change:
+• Service type
+• Date  
+• Time
+• Name
+• Email
+
+Please tell me exactly what you want to change (e.g., "change the date" or "change the service")."""
+
+# Change menu shown after the user declines a confirmation; a header is prepended
+_CHANGE_MENU_BODY = """
+
+You can change:
+• Service type
+• Date  
+• Time
+• Name
+• Email
+
+Please tell me exactly what you want to change (e.g., "change the date" or "change the service")."""
+
+_APPOINTMENT_LINE_TEMPLATE = "{}. **{}** on {} at {} (ID: {})"
+
+_APPOINTMENT_SELECTION_TEMPLATE = """🔄 **Which appointment would you like to change?**
+
+You have {count} appointment(s):
+
+{appointments}
+
+Please reply with the number (1-{count}) of the appointment you want to change."""
+
+_BOOKED_TEMPLATE = """✅ **Appointment Successfully Booked!**
+
+📋 **Your Appointment Details:**
+━━━━━━━━━━━━━━━━━━━━━━
+• **Service:** {service}
+• **Date:** {date}
+• **Time:** {time}
+• **Name:** {name}
+━━━━━━━━━━━━━━━━━━━━━━
+
+{email_status} to: **{email}**
+
+**Appointment ID:** `{appointment_id}`
+
+Thank you for choosing COB Company! 🎉
+
+Is there anything else I can help you with?"""
+
+_UPDATED_TEMPLATE = """✅ **Appointment Successfully Updated!**
+
+Your appointment (ID: {appointment_id}) has been updated with the new details.
+
+📋 **Updated Appointment Details:**
+━━━━━━━━━━━━━━━━━━━━━
+• **Service:** {service}
+• **Date:** {date}
+• **Time:** {time}
+• **Name:** {name}
+• **Email:** {email}
+━━━━━━━━━━━━━━━━━━━━━
+
+A confirmation email has been sent to {email}.
+
+Is there anything else I can help you with?"""
+
+
+# Appended when re-showing a confirmation the user did not answer yes/no to
+_CONFIRMATION_REPROMPT_FOOTER = "\n\n**Please reply with:**\n✅ **\"Yes\"** to confirm\n❌ **\"No\"** to make changes\n\n*(Just type \"yes\" or \"no\")*"
+
+
+# Menu / service numbers accepted as a selection
+SELECTION_NUMBERS = frozenset({'1', '2', '3', '4', '5', '6'})
+
+# Single-token replies with a fixed intent; these skip the classifier.
+# Bare digits are always menu selections; yes/no only while confirming.
+TRIVIAL_INTENTS = {digit: 'menu_selection' for digit in ('1', '2', '3', '4', '5')}
+CONFIRMATION_REPLIES = frozenset({'yes', 'no', 'yeah', 'yep', 'nope'})
+
+# Replies accepted as yes / no at the appointment confirmation prompt
+YES_RESPONSES = frozenset({'yes', 'yeah', 'yep', 'sure', 'ok', 'okay', 'correct', 'right', 'confirm', 'confirmed', 'y', 'yea'})
+NO_RESPONSES = frozenset({'no', 'nope', 'nah', 'wrong', 'incorrect', 'change', 'edit', 'n'})
+
+CANCEL_WORDS = ('cancel', 'stop', 'exit', 'nevermind', 'forget it', 'abort')
+
+# Upper bound on live conversations; the oldest are evicted first
+MAX_CONVERSATIONS = 10_000
+
+# Confirmation emails queued within this window (seconds) are sent together,
+# one combined email per recipient
+EMAIL_BATCH_WINDOW = 0.5
+
+# Separator framing the per-message debug dump
+_LOG_RULE = '=' * 60
+
+# Masked bot responses kept for reuse (responses are mostly templates)
+MASKED_RESPONSE_CACHE_SIZE = 2048
+
+
+# Routing keyword groups, scanned in one pass per message. Services come first
+# in match priority order, so the lowest service bit is the detected service.
+_SERVICE_KEYWORDS = (
+    ('consultation', ('consultation', 'consult', 'advice', 'guidance')),
+    ('support', ('support', 'help', 'assistance', 'fix', 'issue', 'problem')),
+    ('installation', ('installation', 'install', 'setup', 'implement')),
+    ('maintenance', ('maintenance', 'maintain', 'service', 'checkup')),
+    ('training', ('training', 'train', 'learn', 'teach', 'educate')),
+    ('demo', ('demo', 'demonstration', 'show', 'presentation'))
+)
+_ROUTING_SCANNER = build_keyword_scanner(_SERVICE_KEYWORDS + (
+    ('cancel', CANCEL_WORDS),
+    ('change', ('change', 'modify', 'update', 'edit', 'reschedule')),
+    ('appointment_mention', ('appointment', 'meeting', 'schedule', 'booking', 'demo'))
+))
+_SERVICE_BITS = (1 << len(_SERVICE_KEYWORDS)) - 1
+_CANCEL_BIT, _CHANGE_BIT, _APPOINTMENT_MENTION_BIT = (
+    1 << len(_SERVICE_KEYWORDS), 1 << (len(_SERVICE_KEYWORDS) + 1), 1 << (len(_SERVICE_KEYWORDS) + 2)
+)
 
 
 class DialogManager:
@@ -43,12 +225,41 @@ class DialogManager:
         self.knowledge_service = KnowledgeService(self.rag_engine)
         self.appointment_flow = AppointmentFlow(self.appointment_service)
         self.escalation_handler = EscalationHandler(self.security)  
+        # Bot text repeats across turns; user text is masked uncached so raw
+        # user input is not retained in cache keys
+        self._mask_bot_text = lru_cache(maxsize=MASKED_RESPONSE_CACHE_SIZE)(self.security.mask_pii)
+        self.knowledge_cache = SemanticCache(
+            self.rag_engine.generate_embedding,
+            capacity=settings.SEMANTIC_CACHE_SIZE,
+            max_distance=settings.SEMANTIC_CACHE_MAX_DISTANCE
+        )
+        
+        # Load knowledge base in the background; knowledge queries check _kb_ready
+        self._kb_ready = threading.Event()
+        threading.Thread(target=self._load_knowledge_base, name="kb-loader", daemon=True).start()
         
-        # Load knowledge base
-        self._load_knowledge_base()
+        # Intent -> handler(user_id, message, intent_details, conv_state, context)
+        self._intent_dispatch = {
+            'action': lambda uid, msg, details, cs, ctx: self._start_appointment_flow(uid, msg, details),
+            'greeting': lambda uid, msg, details, cs, ctx: IntentHandlers.handle_greeting(details),
+            'goodbye': lambda uid, msg, details, cs, ctx: IntentHandlers.handle_goodbye(details),
+            'knowledge_base': lambda uid, msg, details, cs, ctx: self._handle_knowledge_query(msg, details)
+        }
+        # New queries right after a booking ('action' is excluded by the caller)
+        self._post_appointment_dispatch = {
+            'menu_selection': lambda uid, msg, details, cs, ctx: IntentHandlers.handle_menu_selection(msg, ctx),
+            'greeting': self._intent_dispatch['greeting'],
+            'goodbye': self._intent_dispatch['goodbye'],
+            'knowledge_base': self._intent_dispatch['knowledge_base'],
+            'escalation': lambda uid, msg, details, cs, ctx: self._escalate_after_appointment(uid, cs)
+        }
         
-        # Conversation states
-        self.conversations: Dict[str, Dict] = {}
+        # Confirmation emails go out on a worker thread, off the response path
+        self._email_queue = queue.Queue()  # (to_email, appointment) pairs
+        threading.Thread(target=self._email_worker, name="email-sender", daemon=True).start()
+        
+        # Conversation states, kept in creation (start_time_ns) order
+        self.conversations: Dict[str, ConversationState] = OrderedDict()
         
         logger.info("✅ Dialog Manager initialized with refactored structure")
     
@@ -66,98 +277,88 @@ class DialogManager:
             
         except Exception as e:
             logger.error(f"❌ Error loading knowledge base: {e}")
+        finally:
+            self._kb_ready.set()
     
-    def _init_conversation_state(self) -> Dict:
+    def _init_conversation_state(self) -> ConversationState:
         """Initialize a new conversation state."""
-        return {
-            'history': [],
-            'context': {},
-            'appointment_flow': None,
-            'appointment_data': {},
-            'current_question': None,
-            'waiting_for_confirmation': False,
-            'start_time': datetime.now().isoformat(),
-            'message_count': 0,
-            'last_intent': None,
-            'demo_flow': False,
-            'last_menu': None,
-            'modifying_existing_appointment': False,
-            'existing_appointment_id': None,
-            'failure_reasons': [],  
-            'last_escalation_check': None  
-        }
+        return ConversationState()
     
     def _log_processing_info(self, user_id: str, message: str, 
-                            intent_details: Dict, conv_state: Dict):
-        """Log processing information."""
-        logger.info(f"\n{'='*60}")
-        logger.info(f"User: {user_id}")
-        logger.info(f"Message: '{message}'")
-        logger.info(f"Intent: {intent_details['intent']} (confidence: {intent_details.get('confidence', 0):.2f})")
-        logger.info(f"Entities: {intent_details.get('entities', {})}")
-        logger.info(f"Flow: {conv_state.get('appointment_flow')}")
-        logger.info(f"Failure count: {len(conv_state.get('failure_reasons', []))}")
-        logger.info(f"{'='*60}\n")
+                            intent_details: Dict, conv_state: ConversationState):
+        """Log processing information (debug level; arguments are formatted lazily)."""
+        logger.debug(
+            "\n{}\nUser: {}\nMessage: '{}'\nIntent: {} (confidence: {:.2f})\nEntities: {}\nFlow: {}\nFailure count: {}\n{}\n",
+            _LOG_RULE, user_id, message,
+            intent_details['intent'], intent_details.get('confidence', 0),
+            intent_details.get('entities', {}),
+            conv_state.appointment_flow, len(conv_state.failure_reasons), _LOG_RULE
+        )
     
     def process_message(self, user_id: str, message: str) -> Dict[str, Any]:
         """Main entry point for processing messages."""
         try:
             clean_message = message.strip().strip('"\'')
             sanitized_message = self.security.sanitize_input(clean_message)
+            # Lowercased once and shared by the keyword checks in routing
+            message_lower = sanitized_message.lower()
             
             # Get or create conversation state
             if user_id not in self.conversations:
                 self.conversations[user_id] = self._init_conversation_state()
             
             conv_state = self.conversations[user_id]
-            conv_state['message_count'] += 1
+            conv_state.message_count += 1
+            history = conv_state.history
+            
+            # Recent user messages, shared read-only by intent and escalation checks
+            recent_users = [h.user for h in islice(history, max(0, len(history) - 5), None)]
             
             # Build context for intent classification
             context = {
-                'last_bot_message': conv_state['history'][-1].get('bot', '') if conv_state['history'] else '',
-                'appointment_flow': conv_state.get('appointment_flow'),
-                'waiting_for_confirmation': conv_state.get('waiting_for_confirmation', False),
-                'modifying_existing_appointment': conv_state.get('modifying_existing_appointment', False),
-                'history': [h.get('user', '') for h in conv_state['history'][-5:]]
+                'last_bot_message': history[-1].bot if history else '',
+                'appointment_flow': conv_state.appointment_flow,
+                'waiting_for_confirmation': conv_state.waiting_for_confirmation,
+                'modifying_existing_appointment': conv_state.modifying_existing_appointment,
+                'history': recent_users
             }
             
-            # Get intent with context
-            intent_details = self.intent_classifier.get_intent_details(sanitized_message, context)
-            conv_state['last_intent'] = intent_details['intent']
-            
-            #  Check for escalation BEFORE normal routing
-            escalation_context = {
-                'current_message': sanitized_message,
-                'last_bot_message': context.get('last_bot_message', ''),
-                'history': [h.get('user', '') for h in conv_state['history'][-5:]],
-                'intent_confidence': intent_details.get('confidence', 1.0),
-                'current_question': conv_state.get('current_question'),
-                'waiting_for_confirmation': conv_state.get('waiting_for_confirmation', False)
-            }
+            # Get intent with context (trivial replies skip the classifier)
+            intent_details = (self._trivial_intent_details(message_lower.strip(), conv_state)
+                              or self.intent_classifier.get_intent_details(sanitized_message, context))
+            conv_state.last_intent = intent_details['intent']
             
-            escalation_decision = self.escalation_handler.should_escalate(
-                user_id, 
-                sanitized_message, 
-                escalation_context
-            )
+            #  Check for escalation BEFORE normal routing (full check only when a trigger is possible)
+            intent_confidence = intent_details.get('confidence', 1.0)
+            escalation_decision = None
+            if self.escalation_handler.may_escalate(user_id, sanitized_message, intent_confidence, recent_users):
+                escalation_context = {
+                    'current_message': sanitized_message,
+                    'last_bot_message': context.get('last_bot_message', ''),
+                    'history': recent_users,
+                    'intent_confidence': intent_confidence,
+                    'current_question': conv_state.current_question,
+                    'waiting_for_confirmation': conv_state.waiting_for_confirmation
+                }
+                
+                escalation_decision = self.escalation_handler.should_escalate(
+                    user_id, 
+                    sanitized_message, 
+                    escalation_context
+                )
             
-            if escalation_decision['should_escalate']:
+            if escalation_decision and escalation_decision['should_escalate']:
                 logger.warning(f"🚨 Escalation triggered: {escalation_decision['reason']}")
                 
                 # Initiate escalation
                 escalation_ticket = self.escalation_handler.initiate_escalation(
                     user_id,
-                    {
-                        'user_id': user_id,
-                        'history': conv_state['history'][-10:] if conv_state['history'] else [],
-                        'failure_reasons': conv_state.get('failure_reasons', []),
-                        'current_context': escalation_context
-                    },
+                    self._build_escalation_payload(user_id, conv_state, current_context=escalation_context),
                     escalation_decision['reason']
                 )
                 
                 # Add failure reason to track
-                conv_state['failure_reasons'].append(escalation_decision['reason'])
+                conv_state.failure_reasons.append(escalation_decision['reason'])
                 
                 return {
                     'response': self.escalation_handler.get_escalation_message(escalation_ticket['ticket_id']),
@@ -172,12 +373,13 @@ class DialogManager:
             self._log_processing_info(user_id, sanitized_message, intent_details, conv_state)
             
             # Route message
-            response = self._route_message(user_id, sanitized_message, intent_details, conv_state, context)
+            response = self._route_message(user_id, sanitized_message, intent_details, conv_state, context,
+                                           message_lower)
             
             #  Check if response indicates failure
             if response.get('intent') in ['error', 'unknown'] and response.get('confidence', 1) < 0.3:
                 failure_reason = f"Low confidence response for intent: {response.get('intent')}"
-                conv_state['failure_reasons'].append(failure_reason)
+                conv_state.failure_reasons.append(failure_reason)
                 logger.warning(f"⚠️ Conversation failure recorded: {failure_reason}")
             
             # Update history
@@ -185,10 +387,10 @@ class DialogManager:
             
             # Reset failure tracker on successful interaction
             if response.get('intent') in ['appointment_confirmed', 'knowledge_base', 'greeting']:
-                if conv_state.get('failure_reasons'):
+                if conv_state.failure_reasons:
                     self.escalation_handler.reset_user_tracker(user_id)
-                    conv_state['failure_reasons'] = []
-                    logger.info(f"🔄 Reset failure tracker for user {user_id} after successful interaction")
+                    conv_state.failure_reasons = []
+                    logger.info("🔄 Reset failure tracker for user {} after successful interaction", user_id)
             
             # Cleanup old conversations
             self._cleanup_old_conversations()
@@ -199,81 +401,81 @@ class DialogManager:
             logger.error(f"❌ Error in process_message: {str(e)}", exc_info=True)
             return IntentHandlers.handle_error()
     
-    def _update_history(self, conv_state: Dict, message: str, response: Dict, intent_details: Dict):
+    def _trivial_intent_details(self, token: str, conv_state: ConversationState) -> Optional[Dict]:
+        """Return intent details for a reply whose intent is fixed, else None."""
+        if token in TRIVIAL_INTENTS:
+            intent, confidence = TRIVIAL_INTENTS[token], 0.85
+        elif token in CONFIRMATION_REPLIES and conv_state.waiting_for_confirmation:
+            intent, confidence = 'confirmation', 0.95
+        else:
+            return None
+        return {'intent': intent, 'confidence': confidence, 'entities': {}, 'is_frustrated': False}
+    
+    def _update_history(self, conv_state: ConversationState, message: str, response: Dict, intent_details: Dict):
         """Update conversation history."""
-        conv_state['history'].append({
-            'user': self.security.mask_pii(message),
-            'bot': self.security.mask_pii(response.get('response', '')),
-            'timestamp': datetime.now().isoformat(),
-            'intent': intent_details['intent'],
-            'needs_escalation': response.get('needs_escalation', False)
-        })
-    
-    def _determine_demo_product(self, conv_state: Dict) -> str:
+        entry = HistoryEntry(
+            user=self.security.mask_pii(message),
+            bot=self._mask_bot_text(response.get('response', '')),
+            timestamp_ns=time.time_ns(),
+            intent=intent_details['intent'],
+            needs_escalation=response.get('needs_escalation', False)
+        )
+        conv_state.history.append(entry)
+        
+        if not conv_state.bot_mentioned_appointment and 'appointment' in entry.bot.lower():
+            conv_state.bot_mentioned_appointment = True
+    
+    def _determine_demo_product(self, conv_state: ConversationState) -> str:
         """Determine which product to demo based on conversation history."""
         # Look for product mentions in recent conversation history
-        history = conv_state.get('history', [])
-        
-        # Check last few messages for product mentions
-        for i in range(min(5, len(history))):
-            item = history[-(i+1)]  # Look backwards from most recent
-            user_msg = item.get('user', '').lower()
-            bot_msg = item.get('bot', '').lower()
-            
-            # Check user messages
-            if 'enterprise' in user_msg or 'suite' in user_msg:
-                return 'enterprise_suite'
-            elif 'analytics' in user_msg:
-                return 'analytics_pro'
-            elif 'cloud' in user_msg:
-                return 'cloud_services'
-            
-            # Check bot messages
-            if 'enterprise suite' in bot_msg:
-                return 'enterprise_suite'
-            elif 'analytics pro' in bot_msg:
-                return 'analytics_pro'
-            elif 'cloud services' in bot_msg:
-                return 'cloud_services'
+        history = conv_state.history
+        
+        # Check last few messages for product mentions, most recent first
+        for item in islice(reversed(history), 5):
+            product = (_mentioned_product(_USER_PRODUCT_RE, _USER_PRODUCT_WORDS, item.user)
+                       or _mentioned_product(_BOT_PRODUCT_RE, _BOT_PRODUCT_NAMES, item.bot))
+            if product:
+                return product
         
         # Default to general demo
         return 'general'
 
     def _route_message(self, user_id: str, message: str, intent_details: Dict, 
-                conv_state: Dict, context: Dict) -> Dict:
-        """Route message to appropriate handler."""
+                conv_state: ConversationState, context: Dict, message_lower: str) -> Dict:
+        """Route message to appropriate handler (message is sanitized and stripped)."""
         intent = intent_details['intent']
+        # One pass finds every routing keyword category present in the message
+        keyword_mask = scan_keywords(_ROUTING_SCANNER, message_lower)
         
         #  Check appointment flow FIRST (including service selection) 
-        if (conv_state.get('appointment_flow') in ['started', 'collecting_details', 'modifying'] and 
-            conv_state.get('current_question') == 'service_type'):
+        if (conv_state.appointment_flow in ['started', 'collecting_details', 'modifying'] and 
+            conv_state.current_question == 'service_type'):
             
             # Check if message is a number (1-6) for service selection
-            if message.strip() in ['1', '2', '3', '4', '5', '6']:
+            if message in SELECTION_NUMBERS:
                 logger.info(f"🔍 In appointment flow, service type selection: {message}")
-                return self._handle_appointment_number_selection(message.strip(), conv_state)
+                return self._handle_appointment_number_selection(user_id, message, conv_state)
             
             # Check if message is a service type name
-            service_type = self._extract_service_type_from_text(message)
+            service_type = self._extract_service_type_from_text(keyword_mask)
             if service_type:
                 logger.info(f"🔍 Extracted service type from text: {service_type}")
-                conv_state['appointment_data']['service_type'] = service_type
+                conv_state.appointment_data['service_type'] = service_type
                 
                 # Determine next question using appointment_flow
-                next_question = self.appointment_flow._get_next_appointment_info(conv_state['appointment_data'])
-                conv_state['current_question'] = next_question
+                next_question = self.appointment_flow._get_next_appointment_info(conv_state.appointment_data)
+                conv_state.current_question = next_question
                 
                 if next_question == 'complete':
-                    conv_state['waiting_for_confirmation'] = True
-                    return self._show_confirmation(conv_state['appointment_data'])
+                    return self.appointment_flow.show_confirmation(user_id, conv_state)
                 
-                return self.appointment_flow._generate_smart_response(conv_state['appointment_data'], next_question)
+                return self.appointment_flow._generate_smart_response(conv_state.appointment_data, next_question)
         
        
        #  Handle menu selections (but only if NOT in appointment flow) 
         if intent == 'menu_selection':
             # Check if we're in appointment flow - if so, treat as regular message
-            if conv_state.get('appointment_flow'):
+            if conv_state.appointment_flow:
                 logger.info(f"⚠️ Menu selection '{message}' while in appointment flow, treating as text")
                 # Fall through to appointment flow handler
             else:
@@ -287,12 +489,11 @@ class DialogManager:
                     # Create escalation ticket using the DialogManager's escalation handler
                     escalation_ticket = self.escalation_handler.initiate_escalation(
                         user_id,  # Use ACTUAL user_id
-                        {
-                            'user_id': user_id,
-                            'history': conv_state['history'][-10:] if conv_state['history'] else [],
-                            'menu_selection': message,
-                            'context': context.get('last_bot_message', '')[:100]
-                        },
+                        self._build_escalation_payload(
+                            user_id, conv_state,
+                            menu_selection=message,
+                            context=context.get('last_bot_message', '')[:100]
+                        ),
                         response.get('escalation_reason', f'Menu selection {message} requested specialist')
                     )
                     
@@ -315,34 +516,19 @@ class DialogManager:
                     demo_product = self._determine_demo_product(conv_state)
                     
                     # Start demo appointment flow
-                    conv_state['appointment_flow'] = 'started'
-                    conv_state['appointment_data'] = {
+                    conv_state.appointment_flow = 'started'
+                    conv_state.appointment_data = {
                         'service_type': 'demo',
                         'demo_type': 'product_demo',
                         'demo_product': demo_product
                     }
-                    conv_state['current_question'] = 'date'
-                    conv_state['waiting_for_confirmation'] = False
+                    conv_state.current_question = 'date'
+                    conv_state.waiting_for_confirmation = False
                     
-                    product_display = {
-                        'enterprise_suite': 'COB Enterprise Suite',
-                        'analytics_pro': 'COB Analytics Pro', 
-                        'cloud_services': 'COB Cloud Services',
-                        'general': 'our products'
-                    }.get(demo_product, 'our products')
+                    product_display = _DEMO_PRODUCT_DISPLAY.get(demo_product, 'our products')
                     
                     return {
-                        'response': f"""🎥 **Schedule a {product_display} Demo**
-
-        I'd be happy to schedule a demo of {product_display} for you!
-
-        **When would you like to schedule your demo?**
-
-        Please provide a date:
-        • Today/Tomorrow
-        • Next Monday/Tuesday/etc.
-        • Specific date like December 15
-        • Day of week like Friday""",
+                        'response': _DEMO_TEMPLATE.format(product=product_display),
                         'intent': 'action',
                         'needs_escalation': False,
                         'action_required': True
@@ -352,72 +538,46 @@ class DialogManager:
         
         # ========== Original routing logic ==========
         # PRIORITY 1: Handle confirmations
-        if conv_state.get('waiting_for_confirmation'):
+        if conv_state.waiting_for_confirmation:
             return self._handle_confirmation(user_id, message, conv_state)
         
         # Also handle confirmation intent even if not flagged yet
-        if intent == 'confirmation' and conv_state.get('appointment_flow') == 'started':
-            conv_state['waiting_for_confirmation'] = True
+        if intent == 'confirmation' and conv_state.appointment_flow == 'started':
+            conv_state.waiting_for_confirmation = True
             return self._handle_confirmation(user_id, message, conv_state)
         
         # PRIORITY 2: Handle appointment flow (including modification flow)
-        if conv_state.get('appointment_flow') in ['started', 'collecting_details', 'modifying']:
-            if self._is_cancellation_request(message):
+        if conv_state.appointment_flow in ['started', 'collecting_details', 'modifying']:
+            if self._is_cancellation_request(keyword_mask):
                 return self._cancel_appointment_flow(user_id, conv_state)
             
             # Check if it's a number selection in appointment flow (for other questions)
-            if message.strip() in ['1', '2', '3', '4', '5', '6']:
-                return self._handle_appointment_number_selection(message.strip(), conv_state)
+            if message in SELECTION_NUMBERS:
+                return self._handle_appointment_number_selection(user_id, message, conv_state)
             
             return self.appointment_flow.handle_flow(user_id, message, conv_state, intent_details)
         
         # Check if appointment was completed and user is asking something else 
-        if (conv_state.get('appointment_flow') is None and 
-            conv_state.get('last_intent') == 'appointment_confirmed' and
+        if (conv_state.appointment_flow is None and 
+            conv_state.last_intent == 'appointment_confirmed' and
             intent not in ['confirmation', 'action']):
             
             # User is asking something new after appointment was booked
-            logger.info(f"🔄 Handling new query after appointment booking")
+            logger.info("🔄 Handling new query after appointment booking")
             
             # Reset the last_intent so we don't keep thinking it's appointment related
-            conv_state['last_intent'] = intent
+            conv_state.last_intent = intent
             
             # Route to appropriate handler
-            if intent == 'menu_selection':
-                return IntentHandlers.handle_menu_selection(message, context)
-            elif intent == 'greeting':
-                return IntentHandlers.handle_greeting(intent_details)
-            elif intent == 'goodbye':
-                return IntentHandlers.handle_goodbye(intent_details)
-            elif intent == 'knowledge_base':
-                return self.knowledge_service.handle_query(message, intent_details)
-            elif intent == 'escalation':
-                # Use escalation handler instead of IntentHandlers
-                escalation_ticket = self.escalation_handler.initiate_escalation(
-                    user_id,
-                    {
-                        'user_id': user_id,
-                        'history': conv_state['history'][-10:] if conv_state['history'] else []
-                    },
-                    "User requested assistance"
-                )
-                
-                return {
-                    'response': self.escalation_handler.get_escalation_message(escalation_ticket['ticket_id']),
-                    'intent': 'escalation',
-                    'needs_escalation': True,
-                    'escalation_ticket_id': escalation_ticket['ticket_id']
-                }
+            handler = self._post_appointment_dispatch.get(intent)
+            if handler:
+                return handler(user_id, message, intent_details, conv_state, context)
         
         #  UPDATED: Handle frustration/escalation using escalation handler 
         if intent_details.get('is_frustrated') or intent == 'escalation':
             escalation_ticket = self.escalation_handler.initiate_escalation(
                 user_id,
-                {
-                    'user_id': user_id,
-                    'history': conv_state['history'][-10:] if conv_state['history'] else [],
-                    'failure_reasons': conv_state.get('failure_reasons', [])
-                },
+                self._build_escalation_payload(user_id, conv_state),
                 "User appears frustrated or requested escalation"
             )
             
@@ -429,57 +589,66 @@ class DialogManager:
             }
         
         # PRIORITY 5: Handle appointment change request
-        if self._is_appointment_change_request(message):
+        if self._is_appointment_change_request(keyword_mask):
             return self._handle_appointment_change_request(user_id, message, conv_state)
         
         # PRIORITY 6: Handle specific intents
-        if intent == 'action':
-            return self._start_appointment_flow(user_id, message, intent_details)
-        elif intent == 'greeting':
-            return IntentHandlers.handle_greeting(intent_details)
-        elif intent == 'goodbye':
-            return IntentHandlers.handle_goodbye(intent_details)
-        elif intent == 'knowledge_base':
-            return self.knowledge_service.handle_query(message, intent_details)
+        handler = self._intent_dispatch.get(intent)
+        if handler:
+            return handler(user_id, message, intent_details, conv_state, context)
         
         # DEFAULT: Treat as knowledge query
-        return self.knowledge_service.handle_query(message, intent_details)
-    
-    def _extract_service_type_from_text(self, message: str) -> Optional[str]:
-        """Extract service type from text."""
-        message_lower = message.lower().strip()
-        
-        service_map = {
-            'consultation': ['consultation', 'consult', 'advice', 'guidance'],
-            'support': ['support', 'help', 'assistance', 'fix', 'issue', 'problem'],
-            'installation': ['installation', 'install', 'setup', 'implement'],
-            'maintenance': ['maintenance', 'maintain', 'service', 'checkup'],
-            'training': ['training', 'train', 'learn', 'teach', 'educate'],
-            'demo': ['demo', 'demonstration', 'show', 'presentation']
+        return self._handle_knowledge_query(message, intent_details)
+    
+    def _build_escalation_payload(self, user_id: str, conv_state: ConversationState, **extra) -> Dict:
+        """Build the conversation context attached to an escalation ticket."""
+        payload = {
+            'user_id': user_id,
+            'history': _tail(conv_state.history, 10),
+            'failure_reasons': conv_state.failure_reasons
         }
-        
-        for service, keywords in service_map.items():
-            if any(keyword in message_lower for keyword in keywords):
-                return service
-        
-        return None
+        payload.update(extra)
+        return payload
     
-    def _is_appointment_change_request(self, message: str) -> bool:
-        """Check if user wants to change an appointment."""
-        change_keywords = ['change', 'modify', 'update', 'edit', 'reschedule']
-        appointment_mentions = ['appointment', 'meeting', 'schedule', 'booking', 'demo']
-        
-        message_lower = message.lower()
+    def _escalate_after_appointment(self, user_id: str, conv_state: ConversationState) -> Dict:
+        """Escalate a help request made right after a booking."""
+        # Use escalation handler instead of IntentHandlers
+        escalation_ticket = self.escalation_handler.initiate_escalation(
+            user_id,
+            self._build_escalation_payload(user_id, conv_state),
+            "User requested assistance"
+        )
         
-        for keyword in change_keywords:
-            if keyword in message_lower:
-                for appointment_word in appointment_mentions:
-                    if appointment_word in message_lower:
-                        return True
+        return {
+            'response': self.escalation_handler.get_escalation_message(escalation_ticket['ticket_id']),
+            'intent': 'escalation',
+            'needs_escalation': True,
+            'escalation_ticket_id': escalation_ticket['ticket_id']
+        }
+    
+    def _handle_knowledge_query(self, message: str, intent_details: Dict) -> Dict:
+        """Answer a knowledge query, reusing cached answers to similar questions."""
+        # Called from the event loop via process_message, so never wait on the load
+        if not self._kb_ready.is_set():
+            return {
+                'response': "I'm still loading our knowledge base. Please ask again in a few seconds.",
+                'intent': 'loading',
+                'needs_escalation': False
+            }
         
-        return False
+        return self.knowledge_cache.get_or_compute(
+            message, lambda: self.knowledge_service.handle_query(message, intent_details)
+        )
+    
+    def _extract_service_type_from_text(self, keyword_mask: int) -> Optional[str]:
+        """Extract service type from the message's routing keyword mask."""
+        return _ROUTING_SCANNER[2].get(lowest_bit(keyword_mask & _SERVICE_BITS))
     
-    def _handle_appointment_change_request(self, user_id: str, message: str, conv_state: Dict) -> Dict:
+    def _is_appointment_change_request(self, keyword_mask: int) -> bool:
+        """Check if user wants to change an appointment (routing keyword mask)."""
+        return bool(keyword_mask & _CHANGE_BIT) and bool(keyword_mask & _APPOINTMENT_MENTION_BIT)
+    
+    def _handle_appointment_change_request(self, user_id: str, message: str, conv_state: ConversationState) -> Dict:
         """Handle requests to change an appointment."""
         user_appointments = self.appointment_service.get_user_appointments(user_id)
         
@@ -496,63 +665,49 @@ class DialogManager:
         
         # Multiple appointments - ask which one
         appointments_list = "\n".join([
-            f"{i+1}. **{apt['service_type'].title()}** on {apt['date']} at {apt['time']} (ID: {apt['appointment_id']})"
+            _APPOINTMENT_LINE_TEMPLATE.format(i + 1, apt['service_type'].title(), apt['date'],
+                                              apt['time'], apt['appointment_id'])
             for i, apt in enumerate(user_appointments[:5])
         ])
         
-        conv_state['pending_appointment_selection'] = True
-        conv_state['available_appointments'] = user_appointments
+        conv_state.pending_appointment_selection = True
+        conv_state.available_appointments = user_appointments
         
         return {
-            'response': f"""🔄 **Which appointment would you like to change?**
-
-You have {len(user_appointments)} appointment(s):
-
-{appointments_list}
-
-Please reply with the number (1-{len(user_appointments)}) of the appointment you want to change.""",
+            'response': _APPOINTMENT_SELECTION_TEMPLATE.format(
+                count=len(user_appointments), appointments=appointments_list
+            ),
             'intent': 'action',
             'needs_escalation': False,
             'action_required': True
         }
     
-    def _start_appointment_modification(self, user_id: str, appointment: Dict, conv_state: Dict) -> Dict:
+    def _start_appointment_modification(self, user_id: str, appointment: Dict, conv_state: ConversationState) -> Dict:
         """Start modifying an existing appointment."""
-        conv_state['appointment_flow'] = 'modifying'
-        conv_state['modifying_existing_appointment'] = True
-        conv_state['existing_appointment_id'] = appointment['appointment_id']
-        conv_state['appointment_data'] = {
+        conv_state.appointment_flow = 'modifying'
+        conv_state.modifying_existing_appointment = True
+        conv_state.existing_appointment_id = appointment['appointment_id']
+        conv_state.appointment_data = {
             'service_type': appointment.get('service_type', ''),
             'date': appointment.get('date', ''),
             'time': appointment.get('time', ''),
             'customer_name': appointment.get('customer_name', ''),
             'email': appointment.get('email', '')
         }
-        conv_state['current_question'] = None
-        conv_state['waiting_for_confirmation'] = False
+        conv_state.current_question = None
+        conv_state.waiting_for_confirmation = False
         
         current_details = []
-        for field, value in conv_state['appointment_data'].items():
+        for field, value in conv_state.appointment_data.items():
             if value and field != 'demo_type':
                 current_details.append(f"• **{field.replace('_', ' ').title()}**: {value}")
         
         details_text = "\n".join(current_details)
         
         return {
-            'response': f"""🔄 **Modifying Appointment** (ID: {appointment['appointment_id']})
-
-Here are your current appointment details:
-{details_text}
-
-**What would you like to change?**
-You can change:
-• Service type
-• Date  
-• Time
-• Name
-• Email
-
-Please tell me exactly what you want to change (e.g., "change the date" or "change the service").""",
+            'response': _MODIFICATION_TEMPLATE.format(
+                appointment_id=appointment['appointment_id'], details=details_text
+            ),
             'intent': 'action',
             'needs_escalation': False,
             'action_required': True
@@ -562,28 +717,28 @@ Please tell me exactly what you want to change (e.g., "change the date" or "chan
         """Start appointment booking."""
         conv_state = self.conversations[user_id]
         
-        if conv_state.get('appointment_flow') not in ['started', 'collecting_details', 'modifying']:
-            conv_state['appointment_flow'] = 'started'
-            conv_state['appointment_data'] = {}
-            conv_state['current_question'] = None
-            conv_state['waiting_for_confirmation'] = False
+        if conv_state.appointment_flow not in ['started', 'collecting_details', 'modifying']:
+            conv_state.appointment_flow = 'started'
+            conv_state.appointment_data = {}
+            conv_state.current_question = None
+            conv_state.waiting_for_confirmation = False
         
         # Extract info using appointment flow
         response = self.appointment_flow.handle_flow(user_id, message, conv_state, intent_details)
         
         # Add greeting only if just started
-        if len([h for h in conv_state.get('history', []) if 'appointment' in h.get('bot', '').lower()]) == 0:
+        if not conv_state.bot_mentioned_appointment:
             greeting = "I'd be happy to help you schedule an appointment! 📅\n\n"
             response['response'] = greeting + response['response']
         
         return response
     
-    def _handle_appointment_number_selection(self, selection: str, conv_state: Dict) -> Dict:
+    def _handle_appointment_number_selection(self, user_id: str, selection: str, conv_state: ConversationState) -> Dict:
         """Handle number selections when in appointment flow."""
-        appointment_data = conv_state['appointment_data']
-        current_question = conv_state.get('current_question')
+        appointment_data = conv_state.appointment_data
+        current_question = conv_state.current_question
         
-        logger.info(f"🔍 Handling appointment number selection: {selection} for question: {current_question}")
+        logger.debug("🔍 Handling appointment number selection: {} for question: {}", selection, current_question)
         
         # Map numbers to service types - ONLY FOR SERVICE TYPE SELECTION
         service_mapping = {
@@ -597,113 +752,65 @@ Please tell me exactly what you want to change (e.g., "change the date" or "chan
         # Handle service type selection
         if current_question == 'service_type' and selection in service_mapping:
             appointment_data['service_type'] = service_mapping[selection]
-            logger.info(f"✅ Selected service type: {appointment_data['service_type']}")
+            logger.info("✅ Selected service type: {}", appointment_data['service_type'])
             
             # Determine next question using appointment_flow
             next_question = self.appointment_flow._get_next_appointment_info(appointment_data)
-            conv_state['current_question'] = next_question
+            conv_state.current_question = next_question
             
             # If all fields are complete, show confirmation immediately
             if next_question == 'complete':
-                conv_state['waiting_for_confirmation'] = True
                 logger.info("✅ All fields complete, showing confirmation immediately")
-                
-                # Check if we're modifying an existing appointment
-                if conv_state.get('modifying_existing_appointment'):
-                    appointment_id = conv_state.get('existing_appointment_id')
-                    return self._show_modification_confirmation(appointment_data, appointment_id)
-                else:
-                    return self._show_confirmation(appointment_data)
+                return self.appointment_flow.show_confirmation(user_id, conv_state)
             
             return self.appointment_flow._generate_smart_response(appointment_data, next_question)
         
         # If not service type selection, treat as regular text
-        logger.info(f"❌ Selection '{selection}' not for service type, treating as text")
+        logger.info("❌ Selection '{}' not for service type, treating as text", selection)
         return self.appointment_flow.handle_flow(
-            "user_127_0_0_1",  # user_id placeholder
+            user_id,
             selection,
             conv_state,
             {'intent': 'unknown', 'entities': {}}
         )
     
-    def _show_confirmation(self, appointment_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Show appointment confirmation."""
-        return {
-            'response': ResponseTemplates.appointment_confirmation(appointment_data, "TEMP-ID"),
-            'intent': 'action',
-            'needs_escalation': False,
-            'action_required': True,
-            'waiting_for_confirmation': True
-        }
-    
-    def _show_modification_confirmation(self, appointment_data: Dict[str, Any], 
-                                       appointment_id: str) -> Dict[str, Any]:
-        """Show modification confirmation."""
-        return {
-            'response': ResponseTemplates.appointment_modification_confirmation(appointment_data, appointment_id),
-            'intent': 'action',
-            'needs_escalation': False,
-            'action_required': True,
-            'waiting_for_confirmation': True
-        }
-    
-    def _handle_confirmation(self, user_id: str, message: str, conv_state: Dict) -> Dict:
+    def _handle_confirmation(self, user_id: str, message: str, conv_state: ConversationState) -> Dict:
         """Handle yes/no confirmation responses."""
         text_lower = message.lower().strip()
+        words = text_lower.split()
         
-        yes_responses = ['yes', 'yeah', 'yep', 'sure', 'ok', 'okay', 'correct', 'right', 'confirm', 'confirmed', 'y', 'yea']
-        no_responses = ['no', 'nope', 'nah', 'wrong', 'incorrect', 'change', 'edit', 'n']
-        
-        is_yes = any(word == text_lower for word in yes_responses)
-        is_no = any(word == text_lower for word in no_responses)
-        
-        if not is_yes:
-            is_yes = any(word in text_lower.split() for word in yes_responses)
+        # Whole reply first, then any single word of it
+        is_yes = text_lower in YES_RESPONSES or not YES_RESPONSES.isdisjoint(words)
+        is_no = text_lower in NO_RESPONSES or not NO_RESPONSES.isdisjoint(words)
         
-        if not is_no:
-            is_no = any(word in text_lower.split() for word in no_responses)
+        logger.debug("🔍 Confirmation check - Is yes: {}, Is no: {}", is_yes, is_no)
         
-        logger.info(f"🔍 Confirmation check - Is yes: {is_yes}, Is no: {is_no}")
+        modifying_existing = conv_state.modifying_existing_appointment
+        appointment_id = conv_state.existing_appointment_id
+        appointment_data = conv_state.appointment_data
         
         if is_yes:
-            conv_state['waiting_for_confirmation'] = False
+            conv_state.waiting_for_confirmation = False
+            conv_state.confirmation_reprompt = None
             
-            if conv_state.get('modifying_existing_appointment'):
-                appointment_id = conv_state.get('existing_appointment_id')
-                return self._update_existing_appointment(user_id, conv_state['appointment_data'], appointment_id)
+            if modifying_existing:
+                return self._update_existing_appointment(user_id, appointment_data, appointment_id)
             else:
-                return self._complete_appointment(user_id, conv_state['appointment_data'])
+                return self._complete_appointment(user_id, appointment_data)
         
         elif is_no:
-            conv_state['waiting_for_confirmation'] = False
-            conv_state['appointment_flow'] = 'modifying'
-            conv_state['current_question'] = None
-            
-            modifying_existing = conv_state.get('modifying_existing_appointment', False)
-            appointment_id = conv_state.get('existing_appointment_id')
+            conv_state.waiting_for_confirmation = False
+            conv_state.confirmation_reprompt = None
+            # Details are about to change; the slot is held again at the next confirmation
+            self.appointment_service.release_slot(user_id)
+            conv_state.appointment_flow = 'modifying'
+            conv_state.current_question = None
             
             if modifying_existing and appointment_id:
-                response_text = f"""🔄 **What would you like to change in your appointment?** (ID: {appointment_id})
-
-You can change:
-• Service type
-• Date  
-• Time
-• Name
-• Email
-
-Please tell me exactly what you want to change (e.g., "change the date" or "change the service")."""
+                header = f"🔄 **What would you like to change in your appointment?** (ID: {appointment_id})"
             else:
-                response_text = """🔄 **What would you like to change?**
-
-You can change:
-• Service type
-• Date  
-• Time
-• Name
-• Email
-
-Please tell me exactly what you want to change (e.g., "change the date" or "change the service")."""
+                header = "🔄 **What would you like to change?**"
+            response_text = header + _CHANGE_MENU_BODY
             
             return {
                 'response': response_text,
@@ -713,20 +820,20 @@ Please tell me exactly what you want to change (e.g., "change the date" or "chan
             }
         
         else:
-            # Show confirmation again
-            modifying_existing = conv_state.get('modifying_existing_appointment', False)
-            
-            if modifying_existing:
-                appointment_id = conv_state.get('existing_appointment_id')
-                confirmation_message = ResponseTemplates.appointment_modification_confirmation(
-                    conv_state['appointment_data'], appointment_id
-                )
-            else:
-                confirmation_message = ResponseTemplates.appointment_confirmation(
-                    conv_state['appointment_data'], "PENDING"
-                )
-            
-            confirmation_message += "\n\n**Please reply with:**\n✅ **\"Yes\"** to confirm\n❌ **\"No\"** to make changes\n\n*(Just type \"yes\" or \"no\")*"
+            # Show confirmation again; the details cannot change until a yes/no,
+            # so render once per confirmation and reuse on further re-prompts
+            confirmation_message = conv_state.confirmation_reprompt
+            if confirmation_message is None:
+                if modifying_existing:
+                    confirmation_message = ResponseTemplates.appointment_modification_confirmation(
+                        appointment_data, appointment_id
+                    )
+                else:
+                    confirmation_message = ResponseTemplates.appointment_confirmation(
+                        appointment_data, "PENDING"
+                    )
+                confirmation_message += _CONFIRMATION_REPROMPT_FOOTER
+                conv_state.confirmation_reprompt = confirmation_message
             
             return {
                 'response': confirmation_message,
@@ -739,156 +846,162 @@ Please tell me exactly what you want to change (e.g., "change the date" or "chan
     def _complete_appointment(self, user_id: str, appointment_data: Dict) -> Dict:
         """Complete appointment booking."""
         try:
+            conv_state = self.conversations[user_id]
+            
+            # Re-check the hold: it may have expired and the slot been taken meanwhile
+            if not self.appointment_service.reserve_slot(appointment_data.get('date'),
+                                                         appointment_data.get('time'), user_id):
+                return self.appointment_flow.slot_taken_response(conv_state)
+            
             appointment = self.appointment_service.create_appointment(user_id, appointment_data)
+            self.appointment_service.release_slot(user_id)
             
-            # Try to send email
-            email_sent = False
-            try:
-                from app.utils.email_sender import email_sender
-                email_sent = email_sender.send_appointment_confirmation(
-                    appointment_data.get('email', ''),
-                    appointment
-                )
-                if email_sent:
-                    logger.info(f"✅ Confirmation email sent")
-                else:
-                    logger.warning(f"⚠️ Could not send email")
-            except Exception as e:
-                logger.warning(f"Email sending error: {e}")
-                email_sent = False
+            # Queue the confirmation email (snapshot: later updates mutate the record)
+            email_queued = settings.EMAIL_ENABLED
+            if email_queued:
+                self._email_queue.put((appointment_data.get('email', ''), dict(appointment)))
             
             # COMPLETELY CLEAR APPOINTMENT STATE 
-            conv_state = self.conversations[user_id]
-            
             # Save the appointment details for confirmation message
-            appointment_details = {
-                'service_type': appointment_data.get('service_type', ''),
-                'date': appointment_data.get('date', ''),
-                'time': appointment_data.get('time', ''),
-                'customer_name': appointment_data.get('customer_name', ''),
-                'email': appointment_data.get('email', '')
-            }
+            appointment_id = appointment['appointment_id']
+            service_type = appointment_data.get('service_type', '')
+            date = appointment_data.get('date', '')
+            time_str = appointment_data.get('time', '')
+            customer_name = appointment_data.get('customer_name', '')
+            email = appointment_data.get('email', '')
             
             # CRITICAL: Reset ALL appointment-related state
-            conv_state['appointment_flow'] = None
-            conv_state['appointment_data'] = {}
-            conv_state['current_question'] = None
-            conv_state['waiting_for_confirmation'] = False
-            conv_state['modifying_existing_appointment'] = False
-            conv_state['existing_appointment_id'] = None
-            conv_state['pending_appointment_selection'] = False
-            conv_state['available_appointments'] = None
+            conv_state.reset_appointment()
             
             # Reset failure tracker on successful appointment
             self.escalation_handler.reset_user_tracker(user_id)
-            conv_state['failure_reasons'] = []
+            conv_state.failure_reasons = []
             
-            logger.info(f"✅ Appointment {appointment['appointment_id']} booked and state cleared")
+            logger.info("✅ Appointment {} booked and state cleared", appointment_id)
             
             # Create success message
-            email_status = "✅ Confirmation email has been sent" if email_sent else "⚠️ Could not send confirmation email"
+            email_status = "📧 Confirmation email is being sent" if email_queued else "⚠️ Could not send confirmation email"
             
-            confirmation = f"""✅ **Appointment Successfully Booked!**
-
-📋 **Your Appointment Details:**
-━━━━━━━━━━━━━━━━━━━━━━
-• **Service:** {appointment_details.get('service_type', '').title()}
-• **Date:** {appointment_details.get('date', '')}
-• **Time:** {appointment_details.get('time', '')}
-• **Name:** {appointment_details.get('customer_name', '')}
-━━━━━━━━━━━━━━━━━━━━━━
-
-{email_status} to: **{appointment_details.get('email', '')}**
-
-**Appointment ID:** `{appointment['appointment_id']}`
-
-Thank you for choosing COB Company! 🎉
-
-Is there anything else I can help you with?"""
+            confirmation = _BOOKED_TEMPLATE.format(
+                service=service_type.title(),
+                date=date,
+                time=time_str,
+                name=customer_name,
+                email=email,
+                email_status=email_status,
+                appointment_id=appointment_id
+            )
             
             return {
                 'response': confirmation,
                 'intent': 'appointment_confirmed',
                 'needs_escalation': False,
-                'appointment_id': appointment['appointment_id']
+                'appointment_id': appointment_id
             }
                 
         except Exception as e:
             logger.error(f"❌ Error completing appointment: {e}")
             # Record this as a failure for escalation tracking
-            conv_state = self.conversations.get(user_id, {})
+            conv_state = self.conversations.get(user_id)
             failure_reason = f"Appointment booking error: {str(e)[:50]}"
-            conv_state['failure_reasons'] = conv_state.get('failure_reasons', []) + [failure_reason]
+            if conv_state is not None:
+                conv_state.failure_reasons.append(failure_reason)
             
             return IntentHandlers.handle_escalation(user_id, f"Technical error: {str(e)[:50]}")   
     
+    def _email_worker(self):
+        """Send queued appointment confirmation emails, coalesced per recipient."""
+        while True:
+            batch = [self._email_queue.get()]
+            deadline = time.monotonic() + EMAIL_BATCH_WINDOW
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._email_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            by_recipient: Dict[str, List[Dict]] = {}
+            for to_email, appointment in batch:
+                by_recipient.setdefault(to_email, []).append(appointment)
+            
+            for to_email, appointments in by_recipient.items():
+                self._send_confirmation_email(to_email, appointments)
+            for _ in batch:
+                self._email_queue.task_done()
+    
+    def _send_confirmation_email(self, to_email: str, appointments: List[Dict]):
+        """Send one confirmation email covering the given appointments."""
+        appointment_ids = ', '.join(apt['appointment_id'] for apt in appointments)
+        try:
+            if len(appointments) == 1:
+                sent = email_sender.send_appointment_confirmation(to_email, appointments[0])
+            else:
+                sent = email_sender.send_batch_confirmation(to_email, appointments)
+            if sent:
+                logger.info("✅ Confirmation email sent for {}", appointment_ids)
+            else:
+                logger.warning("⚠️ Could not send email for {}", appointment_ids)
+        except Exception as e:
+            logger.warning(f"Email sending error: {e}")
+    
     def _update_existing_appointment(self, user_id: str, appointment_data: Dict, appointment_id: str) -> Dict:
         """Update an existing appointment."""
         try:
+            if not self.appointment_service.reserve_slot(appointment_data.get('date'), appointment_data.get('time'),
+                                                         user_id, ignore_appointment_id=appointment_id):
+                return self.appointment_flow.slot_taken_response(self.conversations[user_id])
+            
             updated = self.appointment_service.update_appointment(appointment_id, appointment_data)
+            self.appointment_service.release_slot(user_id)
             
             if updated:
                 # Clear appointment state
-                conv_state = self.conversations[user_id]
-                conv_state['appointment_flow'] = None
-                conv_state['appointment_data'] = {}
-                conv_state['current_question'] = None
-                conv_state['waiting_for_confirmation'] = False
-                conv_state['modifying_existing_appointment'] = False
-                conv_state['existing_appointment_id'] = None
+                self.conversations[user_id].reset_appointment()
                 
-                logger.info(f"✅ Appointment {appointment_id} updated")
+                logger.info("✅ Appointment {} updated", appointment_id)
                 
                 return {
-                    'response': f"""✅ **Appointment Successfully Updated!**
-
-Your appointment (ID: {appointment_id}) has been updated with the new details.
-
-📋 **Updated Appointment Details:**
-━━━━━━━━━━━━━━━━━━━━━
-• **Service:** {appointment_data.get('service_type', '').title()}
-• **Date:** {appointment_data.get('date', '')}
-• **Time:** {appointment_data.get('time', '')}
-• **Name:** {appointment_data.get('customer_name', '')}
-• **Email:** {appointment_data.get('email', '')}
-━━━━━━━━━━━━━━━━━━━━━
-
-A confirmation email has been sent to {appointment_data.get('email', '')}.
-
-Is there anything else I can help you with?""",
+                    'response': _UPDATED_TEMPLATE.format(
+                        appointment_id=appointment_id,
+                        service=appointment_data.get('service_type', '').title(),
+                        date=appointment_data.get('date', ''),
+                        time=appointment_data.get('time', ''),
+                        name=appointment_data.get('customer_name', ''),
+                        email=appointment_data.get('email', '')
+                    ),
                     'intent': 'appointment_updated',
                     'needs_escalation': False
                 }
             else:
                 # Record failure for escalation tracking
-                conv_state = self.conversations.get(user_id, {})
+                conv_state = self.conversations.get(user_id)
                 failure_reason = "Could not find appointment to update"
-                conv_state['failure_reasons'] = conv_state.get('failure_reasons', []) + [failure_reason]
+                if conv_state is not None:
+                    conv_state.failure_reasons.append(failure_reason)
                 
                 return IntentHandlers.handle_escalation(user_id, "Could not find appointment to update")
                 
         except Exception as e:
             logger.error(f"❌ Error updating appointment: {e}")
             # Record failure for escalation tracking
-            conv_state = self.conversations.get(user_id, {})
+            conv_state = self.conversations.get(user_id)
             failure_reason = f"Update error: {str(e)[:50]}"
-            conv_state['failure_reasons'] = conv_state.get('failure_reasons', []) + [failure_reason]
+            if conv_state is not None:
+                conv_state.failure_reasons.append(failure_reason)
             
             return IntentHandlers.handle_escalation(user_id, f"Update error: {str(e)[:50]}")
     
-    def _is_cancellation_request(self, message: str) -> bool:
-        """Check if user wants to cancel."""
-        cancel_words = ['cancel', 'stop', 'exit', 'nevermind', 'forget it', 'abort']
-        return any(word in message.lower() for word in cancel_words)
+    def _is_cancellation_request(self, keyword_mask: int) -> bool:
+        """Check if user wants to cancel (routing keyword mask)."""
+        return bool(keyword_mask & _CANCEL_BIT)
     
-    def _cancel_appointment_flow(self, user_id: str, conv_state: Dict) -> Dict:
+    def _cancel_appointment_flow(self, user_id: str, conv_state: ConversationState) -> Dict:
         """Cancel appointment flow."""
-        conv_state['appointment_flow'] = None
-        conv_state['appointment_data'] = {}
-        conv_state['current_question'] = None
-        conv_state['waiting_for_confirmation'] = False
-        conv_state['modifying_existing_appointment'] = False
-        conv_state['existing_appointment_id'] = None
+        conv_state.reset_appointment()
+        self.appointment_service.release_slot(user_id)
         
         return {
             'response': "Appointment booking cancelled. How else can I help you today?",
@@ -897,45 +1010,67 @@ Is there anything else I can help you with?""",
         }
     
     def _cleanup_old_conversations(self, max_age_minutes: int = 60):
-        """Clean up old conversations."""
-        current_time = datetime.now()
-        to_remove = []
+        """Clean up old conversations.
         
-        for user_id, conv in self.conversations.items():
-            start_time = datetime.fromisoformat(conv.get('start_time', current_time.isoformat()))
-            age = (current_time - start_time).total_seconds() / 60
-            
-            if age > max_age_minutes:
-                to_remove.append(user_id)
+        Conversations are kept in creation order, so expired ones sit at the
+        front and the scan stops at the first one still live.
+        """
+        cutoff_ns = time.time_ns() - max_age_minutes * 60 * 1_000_000_000
         
-        for user_id in to_remove:
-            # Clean up escalation tracker too
+        while self.conversations:
+            user_id = next(iter(self.conversations))
+            if (self.conversations[user_id].start_time_ns >= cutoff_ns
+                    and len(self.conversations) <= MAX_CONVERSATIONS):
+                break
+            
+            # Clean up escalation tracker and any slot hold too
             self.escalation_handler.reset_user_tracker(user_id)
+            self.appointment_service.release_slot(user_id)
             del self.conversations[user_id]
             logger.info(f"🗑️  Cleaned up old conversation for user: {user_id}")
     
     # Public methods for API
     def get_conversation_history(self, user_id: str) -> List[Dict]:
         """Get conversation history."""
-        return self.conversations.get(user_id, {}).get('history', [])
+        conv_state = self.conversations.get(user_id)
+        if conv_state is None:
+            return []
+        return [h.to_dict() for h in conv_state.history]
     
     def get_active_conversations(self) -> List[str]:
         """Get active conversations."""
         return list(self.conversations.keys())
     
+    def get_active_conversation_count(self) -> int:
+        """Count active conversations without copying the key list."""
+        return len(self.conversations)
+    
     def get_all_appointments(self) -> List[Dict]:
         """Get all appointments."""
-        return self.appointment_service.appointments
+        return self.appointment_service.get_all_appointments()
+    
+    def get_appointment_count(self) -> int:
+        """Count appointments without copying the appointment list."""
+        return len(self.appointment_service.appointments)
+    
+    def get_appointment_by_id(self, appointment_id: str) -> Optional[Dict]:
+        """Get appointment by ID."""
+        return self.appointment_service.get_appointment_by_id(appointment_id)
     
     def get_user_appointments(self, user_id: str) -> List[Dict]:
         """Get user's appointments."""
         return self.appointment_service.get_user_appointments(user_id)
     
+    def cancel_appointment(self, appointment_id: str) -> Optional[Dict]:
+        """Cancel appointment by ID."""
+        return self.appointment_service.cancel_appointment(appointment_id)
+    
     def clear_conversation(self, user_id: str):
         """Clear conversation."""
         if user_id in self.conversations:
-            # Also reset escalation tracker
+            # Also reset escalation tracker and release any slot hold
             self.escalation_handler.reset_user_tracker(user_id)
+            self.appointment_service.release_slot(user_id)
             del self.conversations[user_id]
             logger.info(f"🗑️  Cleared conversation for user: {user_id}")
     
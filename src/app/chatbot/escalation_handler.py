@@ -12,6 +12,34 @@ from loguru import logger
 from app.config.settings import settings
 from app.utils.security import SecurityManager
 
+# Trigger vocabularies (matched as lowercase substrings)
+EXPLICIT_ESCALATION_PHRASES = (
+    'talk to a human', 'speak to a person', 'real person',
+    'human agent', 'live agent', 'customer service representative',
+    'connect me with someone', 'get me a person', 'agent please',
+    'representative', 'support agent', 'customer support agent'
+)
+NEGATIVE_WORDS = (
+    'frustrated', 'angry', 'annoyed', 'upset', 'disappointed',
+    'terrible', 'awful', 'horrible', 'ridiculous', 'useless',
+    'stupid', 'idiotic', 'waste of time', 'not helpful',
+    'fed up', 'had enough', 'give up', 'not working'
+)
+ABRUPT_WORDS = ('help', 'fix', 'problem', 'issue')
+ISSUE_KEYWORDS = ('not work', 'broken', 'error', 'problem', 'issue')
+TECHNICAL_TERMS = (
+    'api integration', 'custom development', 'enterprise architecture',
+    'migration strategy', 'data migration', 'system integration',
+    'custom workflow', 'advanced configuration'
+)
+FAILURE_INDICATORS = (
+    ('correction', r'(no|not|wrong|that\'s not|incorrect|misunderstood)'),
+    ('repetition', r'(i said|as i said|again|still)'),
+    ('clarification', r'(what i mean is|let me rephrase|i meant)'),
+    ('dissatisfaction', r'(not helpful|not answering|not what i asked)')
+)
+_ISSUE_RE = re.compile('|'.join(map(re.escape, ISSUE_KEYWORDS)), re.IGNORECASE)
+
 
 class EscalationHandler:
     """Handles escalation to human agents with intelligent triggers"""
@@ -36,6 +64,37 @@ class EscalationHandler:
             'time_window_minutes': 30,
             'min_messages_for_analysis': 3
         }
+        
+        # Union of every text trigger, used to skip the full check on plain turns
+        trigger_words = (EXPLICIT_ESCALATION_PHRASES + NEGATIVE_WORDS + ABRUPT_WORDS + ISSUE_KEYWORDS
+                         + TECHNICAL_TERMS + tuple(self.ESCALATION_CONFIG['sensitive_keywords']))
+        self._trigger_re = re.compile(
+            '|'.join([re.escape(word) for word in trigger_words] + [pattern for _, pattern in FAILURE_INDICATORS]),
+            re.IGNORECASE
+        )
+    
+    def may_escalate(self, user_id: str, message: str, intent_confidence: float,
+                     recent_user_messages: List[str]) -> bool:
+        """
+        Cheap conservative pre-check for should_escalate.
+        Returns False only when no escalation trigger can fire for this turn.
+        """
+        tracker = self.conversation_failure_tracker.get(user_id)
+        if tracker and tracker['failures'] >= self.ESCALATION_CONFIG['max_consecutive_failures']:
+            return True
+        
+        if intent_confidence < 0.3 or message.count('!') >= 2:
+            return True
+        
+        # Complex-query word count needs > 25 words, so at least 51 characters
+        if len(message) > 50 or self._trigger_re.search(message):
+            return True
+        
+        if len(message) > 10 and sum(map(str.isupper, message)) / len(message) > 0.5:
+            return True
+        
+        recent = recent_user_messages[-3:]
+        return sum(1 for msg in recent if _ISSUE_RE.search(msg)) >= 2
     
     def should_escalate(self, user_id: str, message: str, context: Dict) -> Dict[str, Any]:
         """
@@ -101,15 +160,8 @@ class EscalationHandler:
     
     def _is_explicit_escalation_request(self, message: str) -> bool:
         """Check if user explicitly requests human agent"""
-        explicit_phrases = [
-            'talk to a human', 'speak to a person', 'real person',
-            'human agent', 'live agent', 'customer service representative',
-            'connect me with someone', 'get me a person', 'agent please',
-            'representative', 'support agent', 'customer support agent'
-        ]
-        
         message_lower = message.lower()
-        return any(phrase in message_lower for phrase in explicit_phrases)
+        return any(phrase in message_lower for phrase in EXPLICIT_ESCALATION_PHRASES)
     
     def _detect_frustration(self, message: str, context: Dict) -> Dict[str, Any]:
         """Detect user frustration using multiple signals"""
@@ -117,14 +169,7 @@ class EscalationHandler:
         signals = []
         
         # Signal 1: Negative sentiment words
-        negative_words = [
-            'frustrated', 'angry', 'annoyed', 'upset', 'disappointed',
-            'terrible', 'awful', 'horrible', 'ridiculous', 'useless',
-            'stupid', 'idiotic', 'waste of time', 'not helpful',
-            'fed up', 'had enough', 'give up', 'not working'
-        ]
-        
-        negative_count = sum(1 for word in negative_words if word in message_lower)
+        negative_count = sum(1 for word in NEGATIVE_WORDS if word in message_lower)
         if negative_count > 0:
             signals.append(('negative_words', min(negative_count * 0.3, 1.0)))
         
@@ -139,7 +184,7 @@ class EscalationHandler:
         
         # Signal 3: Short, abrupt messages
         words = message.split()
-        if len(words) <= 3 and any(word in message_lower for word in ['help', 'fix', 'problem', 'issue']):
+        if len(words) <= 3 and any(word in message_lower for word in ABRUPT_WORDS):
             signals.append(('abrupt_message', 0.3))
         
         # Signal 4: Repetition in conversation history
@@ -147,10 +192,9 @@ class EscalationHandler:
             recent_messages = context['history'][-3:]  # Last 3 user messages
             if len(recent_messages) >= 2:
                 # Check if same issue mentioned multiple times
-                issue_keywords = ['not work', 'broken', 'error', 'problem', 'issue']
                 issue_count = sum(
                     1 for msg in recent_messages 
-                    if any(keyword in msg.lower() for keyword in issue_keywords)
+                    if any(keyword in msg.lower() for keyword in ISSUE_KEYWORDS)
                 )
                 if issue_count >= 2:
                     signals.append(('repeated_issue', 0.6))
@@ -214,14 +258,7 @@ class EscalationHandler:
         message = context.get('current_message', '').lower()
         last_bot_response = context.get('last_bot_message', '').lower()
         
-        failure_indicators = [
-            ('correction', r'(no|not|wrong|that\'s not|incorrect|misunderstood)'),
-            ('repetition', r'(i said|as i said|again|still)'),
-            ('clarification', r'(what i mean is|let me rephrase|i meant)'),
-            ('dissatisfaction', r'(not helpful|not answering|not what i asked)')
-        ]
-        
-        for indicator_type, pattern in failure_indicators:
+        for indicator_type, pattern in FAILURE_INDICATORS:
             if re.search(pattern, message):
                 return {
                     'is_failure': True,
@@ -292,11 +329,7 @@ class EscalationHandler:
             }
         
         # Check for advanced technical terms
-        technical_terms = ['api integration', 'custom development', 'enterprise architecture',
-                          'migration strategy', 'data migration', 'system integration',
-                          'custom workflow', 'advanced configuration']
-        
-        if any(term in message_lower for term in technical_terms):
+        if any(term in message_lower for term in TECHNICAL_TERMS):
             return {
                 'is_complex': True,
                 'confidence': 0.8,
@@ -364,8 +397,8 @@ class EscalationHandler:
             recent_history = context['history'][-5:]  # Last 5 exchanges
             summary_parts.append("\nRecent conversation:")
             for exchange in recent_history:
-                user_msg = self.security.mask_pii(exchange.get('user', ''))[:100]
-                bot_msg = self.security.mask_pii(exchange.get('bot', ''))[:100]
+                user_msg = self.security.mask_pii(exchange.user)[:100]
+                bot_msg = self.security.mask_pii(exchange.bot)[:100]
                 summary_parts.append(f"  User: {user_msg}")
                 summary_parts.append(f"  Bot: {bot_msg}")
         
@@ -8,6 +8,18 @@ import re
 
 from app.config.response_templates import ResponseTemplates
 
+# Greeting/goodbye replies don't depend on intent details; build them once
+_GREETING_RESPONSE = {
+    'response': ResponseTemplates.greeting(),
+    'intent': 'greeting',
+    'needs_escalation': False
+}
+_GOODBYE_RESPONSE = {
+    'response': ResponseTemplates.goodbye(),
+    'intent': 'goodbye',
+    'needs_escalation': False
+}
+
 
 class IntentHandlers:
     """Handlers for different intents."""
@@ -15,20 +27,13 @@ class IntentHandlers:
     @staticmethod
     def handle_greeting(intent_details: Dict[str, Any]) -> Dict[str, Any]:
         """Handle greeting intent."""
-        return {
-            'response': ResponseTemplates.greeting(),
-            'intent': 'greeting',
-            'needs_escalation': False
-        }
+        # Copy so callers can't mutate the shared template
+        return dict(_GREETING_RESPONSE)
     
     @staticmethod
     def handle_goodbye(intent_details: Dict[str, Any]) -> Dict[str, Any]:
         """Handle goodbye intent."""
-        return {
-            'response': ResponseTemplates.goodbye(),
-            'intent': 'goodbye',
-            'needs_escalation': False
-        }
+        return dict(_GOODBYE_RESPONSE)
     
     @staticmethod
     def handle_escalation(user_id: str, reason: str) -> Dict[str, Any]:
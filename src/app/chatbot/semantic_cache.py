@@ -0,0 +1,93 @@
+"""
+Approximate semantic cache for knowledge-base responses.
+Similar repeat questions reuse a previous answer instead of a full RAG search.
+"""
+
+from typing import Callable, Dict, List, Optional, Any
+import numpy as np
+from loguru import logger
+
+
+class SemanticCache:
+    """LRU cache keyed on normalized query embeddings, matched by cosine distance."""
+
+    def __init__(self, embed: Callable[[str], List[float]],
+                 capacity: int = 1024, max_distance: float = 0.05):
+        self._embed = embed
+        self.capacity = capacity
+        self.max_distance = max_distance
+
+        # Unit-norm keys as one (capacity, dim) float32 block, allocated on first insert
+        self._keys: Optional[np.ndarray] = None
+        self._scores = np.empty(capacity, dtype=np.float32)
+        self._responses: List[Dict[str, Any]] = []
+        # Logical clock per slot for LRU eviction
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._clock = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed text as a unit-norm float32 vector."""
+        vector = np.asarray(self._embed(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Return a copy of the closest cached response within max_distance, else None."""
+        size = len(self._responses)
+        if not size:
+            self.misses += 1
+            return None
+
+        # Keys and query are unit-norm, so cosine distance is 1 - dot product;
+        # one BLAS matvec into a reused buffer, then argmax on similarity
+        scores = self._scores[:size]
+        np.dot(self._keys[:size], query, out=scores)
+        best = int(np.argmax(scores))
+        if 1.0 - scores[best] > self.max_distance:
+            self.misses += 1
+            return None
+
+        self._clock += 1
+        self._last_used[best] = self._clock
+        self.hits += 1
+        return dict(self._responses[best])
+
+    def insert(self, query: np.ndarray, response: Dict[str, Any]):
+        """Store a response under its query embedding, evicting the LRU entry when full."""
+        if self._keys is None:
+            self._keys = np.empty((self.capacity, query.shape[0]), dtype=np.float32)
+
+        size = len(self._responses)
+        if size < self.capacity:
+            slot = size
+            self._responses.append(dict(response))
+        else:
+            slot = int(np.argmin(self._last_used))
+            self._responses[slot] = dict(response)
+
+        self._keys[slot] = query
+        self._clock += 1
+        self._last_used[slot] = self._clock
+
+    def get_or_compute(self, text: str, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Serve text from the cache, or compute, cache and return a fresh response."""
+        query = self.embed(text)
+        cached = self.lookup(query)
+        if cached is not None:
+            logger.debug("⚡ Semantic cache hit for '{}'", text)
+            return cached
+
+        response = compute()
+        # Escalations open tickets; never replay them from cache
+        if not response.get('needs_escalation'):
+            self.insert(query, response)
+        return response
+
+    def clear(self):
+        """Drop all cached responses."""
+        self._responses.clear()
+        self._last_used[:] = 0
+        self._clock = 0
@@ -24,12 +24,12 @@ VALID_SERVICES: Dict[str, str] = {
 }
 
 # Appointment time slots (in minutes from start hour)
-APPOINTMENT_SLOTS = [
+APPOINTMENT_SLOTS = (
     "2:00 PM", "2:30 PM", "3:00 PM", "3:30 PM",
     "4:00 PM", "4:30 PM", "5:00 PM", "5:30 PM",
     "6:00 PM", "6:30 PM", "7:00 PM", "7:30 PM",
     "8:00 PM", "8:30 PM", "9:00 PM"
-]
+)
 
 # Product information structure
 PRODUCT_CATEGORIES = {
@@ -26,6 +26,8 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
     SIMILARITY_THRESHOLD: float = 0.3
     INTENT_CONFIDENCE_THRESHOLD: float = 0.6
+    SEMANTIC_CACHE_SIZE: int = 1024
+    SEMANTIC_CACHE_MAX_DISTANCE: float = 0.05  # cosine distance for a cache hit
     
     # Qdrant Settings
     QDRANT_HOST: str = "localhost"
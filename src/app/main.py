@@ -22,6 +22,7 @@ from app.health.health_check import HealthChecker
 from app.analytics.conversation_analytics import ConversationAnalytics
 from app.utils.security import SecurityManager
 from app.utils.email_sender import email_sender
+from app.chatbot.api_client import get_shared_client, close_shared_client
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -125,6 +126,9 @@ async def startup_event():
     """Initialize on startup"""
     setup_logger()
     
+    # Warm up the shared HTTP client used for external API calls
+    await get_shared_client()
+    
     # Load initial knowledge base in background
     asyncio.create_task(load_knowledge_base())
     
@@ -145,6 +149,11 @@ async def startup_event():
     {'='*60}
     """)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release resources on shutdown"""
+    await close_shared_client()
+
 async def load_knowledge_base():
     """Load knowledge base asynchronously"""
     try:
@@ -205,10 +214,10 @@ async def health_check(background_tasks: BackgroundTasks):
         escalation_queue = dialog_manager.get_escalation_queue()
         
         health_data['service'] = {
-            "active_conversations": len(dialog_manager.get_active_conversations()),
+            "active_conversations": dialog_manager.get_active_conversation_count(),
             "kb_documents": rag_engine.get_collection_info().get('points_count', 0),
             "conversations_tracked": len(analytics.conversations),
-            "appointments_count": len(dialog_manager.get_all_appointments()),
+            "appointments_count": dialog_manager.get_appointment_count(),
             "pending_escalations": len([t for t in escalation_queue if t.get('status') == 'pending']),
             "total_escalations": len(escalation_queue),
             "escalation_rate": f"{len(escalation_queue) / max(len(analytics.conversations), 1) * 100:.1f}%" if analytics.conversations else "0%"
@@ -577,6 +586,8 @@ async def add_document(request: Dict):
         }
         
         rag_engine.index_document(document)
+        # Cached answers predate the new document
+        dialog_manager.knowledge_cache.clear()
         
         return {
             "success": True,
@@ -640,7 +651,7 @@ async def get_analytics(request: AnalyticsRequest = Depends()):
             },
             "insights": insights,
             "daily_report": daily_report,
-            "metrics": analytics.metrics,
+            "metrics": analytics.get_metrics(),
             "total_conversations_tracked": len(analytics.conversations),
             "data_collection_since": analytics.get_earliest_conversation_date()
         }
@@ -671,12 +682,12 @@ async def system_status():
                 "process_create_time": startup_time.isoformat()
             },
             "service": {
-                "active_conversations": len(dialog_manager.get_active_conversations()),
+                "active_conversations": dialog_manager.get_active_conversation_count(),
                 "kb_documents": rag_engine.get_collection_info().get('points_count', 0),
                 "uptime": str(datetime.now() - startup_time),
                 "uptime_seconds": (datetime.now() - startup_time).total_seconds(),
                 "conversations_tracked": len(analytics.conversations),
-                "total_appointments": len(dialog_manager.get_all_appointments()),
+                "total_appointments": dialog_manager.get_appointment_count(),
                 "pending_escalations": len([t for t in escalation_queue if t.get('status') == 'pending']),
                 "total_escalations": len(escalation_queue)
             },
@@ -753,15 +764,12 @@ async def get_appointment(appointment_id: str):
 async def cancel_appointment(appointment_id: str):
     """Cancel an appointment"""
     try:
-        appointment = dialog_manager.get_appointment_by_id(appointment_id)
+        # Update status to cancelled
+        appointment = dialog_manager.cancel_appointment(appointment_id)
         
         if not appointment:
             raise HTTPException(status_code=404, detail="Appointment not found")
         
-        # Update status to cancelled
-        appointment['status'] = 'cancelled'
-        appointment['updated_at'] = datetime.now().isoformat()
-        
         return {
             "message": "Appointment cancelled successfully",
             "appointment_id": appointment_id,
@@ -28,24 +28,11 @@ class CircuitBreaker:
     
     def __call__(self, func: Callable) -> Callable:
         def wrapper(*args, **kwargs) -> Any:
-            # Check if circuit is open
-            if self.state == CircuitState.OPEN:
-                if self._can_retry():
-                    self.state = CircuitState.HALF_OPEN
-                    logger.info("Circuit breaker transitioning to HALF_OPEN")
-                else:
-                    raise Exception("Circuit breaker is OPEN. Service unavailable.")
+            self._before_call()
             
             try:
                 result = func(*args, **kwargs)
-                
-                # Success - reset if needed
-                if self.state == CircuitState.HALF_OPEN:
-                    self.success_count += 1
-                    if self.success_count >= 3:
-                        self._reset()
-                        logger.info("Circuit breaker reset to CLOSED")
-                
+                self._on_success()
                 return result
                 
             except self.expected_exceptions as e:
@@ -54,6 +41,36 @@ class CircuitBreaker:
         
         return wrapper
     
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Await an async callable under this breaker"""
+        self._before_call()
+        
+        try:
+            result = await func(*args, **kwargs)
+            self._on_success()
+            return result
+            
+        except self.expected_exceptions as e:
+            self._on_failure()
+            raise e
+    
+    def _before_call(self):
+        # Check if circuit is open
+        if self.state == CircuitState.OPEN:
+            if self._can_retry():
+                self.state = CircuitState.HALF_OPEN
+                logger.info("Circuit breaker transitioning to HALF_OPEN")
+            else:
+                raise Exception("Circuit breaker is OPEN. Service unavailable.")
+    
+    def _on_success(self):
+        # Success - reset if needed
+        if self.state == CircuitState.HALF_OPEN:
+            self.success_count += 1
+            if self.success_count >= 3:
+                self._reset()
+                logger.info("Circuit breaker reset to CLOSED")
+    
     def _on_failure(self):
         self.failure_count += 1
         self.last_failure_time = time.time()
@@ -56,6 +56,25 @@ class EmailSender:
             logger.error(f"❌ Gmail connection test FAILED: {e}")
             return False
     
+    def _connect(self):
+        """Open a logged-in SMTP connection to Gmail"""
+        logger.info(f"🔗 Connecting to Gmail SMTP: {self.smtp_server}:{self.smtp_port}")
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
+        server.ehlo()
+        
+        if self.use_tls:
+            logger.info("🔒 Starting TLS encryption...")
+            server.starttls()
+            server.ehlo()
+        
+        # Clean password (remove spaces for login)
+        password_clean = self.password.replace(" ", "") if self.password else ""
+        logger.info(f"🔑 Logging into Gmail...")
+        
+        server.login(self.username, password_clean)
+        logger.info("✅ Gmail login successful!")
+        return server
+    
     def send_appointment_confirmation(self, to_email, appointment_data):
         """
         Send appointment confirmation email via Gmail
@@ -147,21 +166,7 @@ Automated message - do not reply."""
             msg.attach(MIMEText(html_content, 'html'))
             
             # Connect to Gmail SMTP
-            logger.info(f"🔗 Connecting to Gmail SMTP: {self.smtp_server}:{self.smtp_port}")
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
-            server.ehlo()
-            
-            if self.use_tls:
-                logger.info("🔒 Starting TLS encryption...")
-                server.starttls()
-                server.ehlo()
-            
-            # Clean password (remove spaces for login)
-            password_clean = self.password.replace(" ", "") if self.password else ""
-            logger.info(f"🔑 Logging into Gmail...")
-            
-            server.login(self.username, password_clean)
-            logger.info("✅ Gmail login successful!")
+            server = self._connect()
             
             # Send email
             logger.info(f"🚀 Sending email to {to_email}...")
@@ -178,6 +183,94 @@ Automated message - do not reply."""
             logger.error(f"❌❌❌ FAILED to send email: {e}")
             return False
     
+    def send_batch_confirmation(self, to_email, appointments):
+        """
+        Send one email confirming several appointments booked together
+        Returns: True if email sent successfully, False otherwise
+        """
+        if not self.enabled:
+            logger.warning("⚠️ Email sending is disabled in settings")
+            return False
+            
+        try:
+            customer_name = appointments[0].get('customer_name', 'Customer')
+            logger.info(f"📤 Preparing batch email for {len(appointments)} appointments to {to_email}...")
+            
+            msg = MIMEMultipart('alternative')
+            msg['From'] = self.from_email
+            msg['To'] = to_email
+            msg['Date'] = formatdate(localtime=True)
+            msg['Subject'] = f"✅ {len(appointments)} Appointments Confirmed"
+            
+            text_items = []
+            html_items = []
+            for apt in appointments:
+                service_type = apt.get('service_type', 'Service')
+                date_str = apt.get('date', '')
+                time_str = apt.get('time', '')
+                appointment_id = apt.get('appointment_id', 'N/A')
+                text_items.append(f"- {service_type} on {date_str} at {time_str} (ID: {appointment_id})")
+                html_items.append(
+                    f'<p><strong>{service_type}</strong> on {date_str} at {time_str}<br>'
+                    f'<span style="color: #666;">Appointment ID: {appointment_id}</span></p>'
+                )
+            
+            html_content = f"""<!DOCTYPE html>
+            <html><body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0;">
+                    <h1 style="margin: 0;">🎉 Appointments Confirmed!</h1>
+                    <h3 style="margin: 10px 0 0; opacity: 0.9;">COB Customer Care Chatbot</h3>
+                </div>
+                <div style="background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px;">
+                    <p>Hello <strong>{customer_name}</strong>,</p>
+                    <p>Your {len(appointments)} appointments have been successfully scheduled!</p>
+                    
+                    <div style="background: white; border-left: 4px solid #667eea; padding: 20px; margin: 20px 0;">
+                        <h3 style="margin-top: 0;">📋 Appointment Details</h3>
+                        {''.join(html_items)}
+                    </div>
+                    
+                    <p style="text-align: center; color: #666;">
+                        We look forward to serving you!<br>
+                        <strong>The COB Company Team</strong>
+                    </p>
+                </div>
+                <div style="text-align: center; color: #999; font-size: 12px; margin-top: 20px; padding-top: 20px; border-top: 1px solid #eee;">
+                    <p>© 2024 COB Company. All rights reserved.</p>
+                    <p>This is an automated message. Please do not reply.</p>
+                </div>
+            </body></html>"""
+            
+            text_items_str = "\n".join(text_items)
+            text_content = f"""APPOINTMENTS CONFIRMED - COB Customer Care
+
+Hello {customer_name},
+
+Your {len(appointments)} appointments have been confirmed!
+
+APPOINTMENT DETAILS:
+{text_items_str}
+
+We look forward to serving you!
+
+The COB Company Team
+© 2024 COB Company. All rights reserved.
+Automated message - do not reply."""
+            
+            msg.attach(MIMEText(text_content, 'plain'))
+            msg.attach(MIMEText(html_content, 'html'))
+            
+            server = self._connect()
+            server.sendmail(self.from_email, to_email, msg.as_string())
+            server.quit()
+            
+            logger.info(f"✅ Batch email SENT to {to_email} ({len(appointments)} appointments)")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ FAILED to send batch email: {e}")
+            return False
+    
     def send_appointment_update(self, to_email, old_appointment, new_appointment):
         """
         Send appointment update confirmation email via Gmail
@@ -0,0 +1,55 @@
+"""
+Single-pass keyword scanning.
+Keyword groups are compiled into one alternation so a single findall over the
+message yields a bitmask of every group hit (plain substring semantics).
+"""
+
+import re
+from typing import Dict, Optional, Tuple
+
+KeywordGroups = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+
+def build_keyword_scanner(groups: KeywordGroups):
+    """Compile (name, keywords) groups into (keyword bits, scan regex, bit -> name).
+
+    Group i gets bit 1 << i, so lower bits mean higher priority.
+    """
+    bit_to_name = {1 << i: name for i, (name, _) in enumerate(groups)}
+    bits: Dict[str, int] = {}
+    for bit, (_, keywords) in zip(bit_to_name, groups):
+        for word in keywords:
+            bits[word] = bits.get(word, 0) | bit
+    # The scan reports only the longest keyword starting at each position, so
+    # fold in the bits of every shorter keyword that is its prefix.
+    bits = {word: _or_prefix_bits(word, bits) for word in bits}
+    scan_re = re.compile(
+        '(?=(' + '|'.join(re.escape(w) for w in sorted(bits, key=len, reverse=True)) + '))'
+    )
+    return bits, scan_re, bit_to_name
+
+
+def _or_prefix_bits(word: str, bits: Dict[str, int]) -> int:
+    mask = 0
+    for other, other_bits in bits.items():
+        if word.startswith(other):
+            mask |= other_bits
+    return mask
+
+
+def scan_keywords(scanner, text_lower: str) -> int:
+    """Return the bitmask of groups with a keyword in the lower-cased text."""
+    bits, scan_re, _ = scanner
+    mask = 0
+    for word in scan_re.findall(text_lower):
+        mask |= bits[word]
+    return mask
+
+
+def lowest_bit(mask: int) -> int:
+    return mask & -mask
+
+
+def first_keyword_match(scanner, text_lower: str) -> Optional[str]:
+    """Return the highest-priority group whose keyword occurs in the lower-cased text."""
+    return scanner[2].get(lowest_bit(scan_keywords(scanner, text_lower)))
@@ -0,0 +1,126 @@
+"""
+Test suite for AppointmentService slot bookkeeping
+"""
+import sys
+import os
+import pytest
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+
+from app.chatbot import appointment_service
+from app.chatbot.appointment_service import AppointmentService
+
+DATE = '2030-01-07'  # a Monday
+TIME = '2:00 PM'
+OTHER_TIME = '3:00 PM'
+
+
+@pytest.fixture
+def service():
+    """Create a fresh service for each test"""
+    return AppointmentService()
+
+def book(service, user_id, date=DATE, time=TIME):
+    """Create a confirmed appointment for user_id at date/time"""
+    return service.create_appointment(user_id, {
+        'service_type': 'consultation',
+        'date': date,
+        'time': time,
+        'customer_name': 'Test User',
+        'email': 'test@example.com'
+    })
+
+class TestCancelAppointment:
+    """Cancelling frees the booked slot"""
+    
+    def test_cancelled_slot_can_be_reserved(self, service):
+        apt = book(service, 'alice')
+        assert not service.reserve_slot(DATE, TIME, 'bob')
+        
+        service.cancel_appointment(apt['appointment_id'])
+        
+        assert TIME in service.get_available_times(DATE)
+        assert service.reserve_slot(DATE, TIME, 'bob')
+    
+    def test_repeated_cancel_frees_slot_once(self, service):
+        first = book(service, 'alice')
+        book(service, 'carol')  # double-booked slot, counted twice
+        
+        service.cancel_appointment(first['appointment_id'])
+        service.cancel_appointment(first['appointment_id'])
+        
+        assert TIME not in service.get_available_times(DATE)
+        assert not service.reserve_slot(DATE, TIME, 'bob')
+    
+    def test_update_does_not_rebook_cancelled(self, service):
+        apt = book(service, 'alice')
+        service.cancel_appointment(apt['appointment_id'])
+        
+        assert service.update_appointment(apt['appointment_id'], {'time': OTHER_TIME}) is None
+        assert apt['status'] == 'cancelled'
+        assert OTHER_TIME in service.get_available_times(DATE)
+
+class TestSlotHolds:
+    """Slots held during confirmation"""
+    
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        """Controllable monotonic clock for hold expiry"""
+        now = [1000.0]
+        monkeypatch.setattr(appointment_service.time, 'monotonic', lambda: now[0])
+        return now
+    
+    def test_held_slot_rejects_other_user(self, service, clock):
+        assert service.reserve_slot(DATE, TIME, 'alice')
+        
+        assert not service.reserve_slot(DATE, TIME, 'bob')
+        assert TIME not in service.get_available_times(DATE)
+    
+    def test_holder_can_reserve_again(self, service, clock):
+        assert service.reserve_slot(DATE, TIME, 'alice')
+        assert service.reserve_slot(DATE, TIME, 'alice')
+    
+    def test_new_hold_replaces_previous(self, service, clock):
+        service.reserve_slot(DATE, TIME, 'alice')
+        service.reserve_slot(DATE, OTHER_TIME, 'alice')
+        
+        assert TIME in service.get_available_times(DATE)
+        assert service.reserve_slot(DATE, TIME, 'bob')
+    
+    def test_hold_expires(self, service, clock):
+        service.reserve_slot(DATE, TIME, 'alice', ttl_seconds=120)
+        
+        clock[0] += 119
+        assert not service.reserve_slot(DATE, TIME, 'bob')
+        
+        clock[0] += 2
+        assert TIME in service.get_available_times(DATE)
+        assert service.reserve_slot(DATE, TIME, 'bob')
+    
+    def test_release_only_drops_own_hold(self, service, clock):
+        service.reserve_slot(DATE, TIME, 'alice', ttl_seconds=120)
+        clock[0] += 121
+        service.reserve_slot(DATE, TIME, 'bob')  # takes over the expired hold
+        
+        service.release_slot('alice')
+        assert not service.reserve_slot(DATE, TIME, 'carol')
+        
+        service.release_slot('bob')
+        assert service.reserve_slot(DATE, TIME, 'carol')
+    
+    def test_booked_slot_cannot_be_held(self, service, clock):
+        book(service, 'alice')
+        assert not service.reserve_slot(DATE, TIME, 'bob')
+    
+    def test_modify_into_own_slot(self, service, clock):
+        apt = book(service, 'alice')
+        
+        assert service.reserve_slot(DATE, TIME, 'alice', ignore_appointment_id=apt['appointment_id'])
+    
+    def test_modify_into_slot_booked_by_other(self, service, clock):
+        own = book(service, 'alice', time=OTHER_TIME)
+        book(service, 'bob')
+        
+        assert not service.reserve_slot(DATE, TIME, 'alice', ignore_appointment_id=own['appointment_id'])
@@ -0,0 +1,61 @@
+"""
+Test suite for conversation state records
+"""
+import sys
+import os
+import time
+from datetime import datetime
+import pytest
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+
+from app.chatbot.conversation_state import ConversationState, HistoryEntry, MAX_HISTORY_TURNS
+
+
+def entry(n):
+    """History entry for turn n"""
+    return HistoryEntry(user=f"user {n}", bot=f"bot {n}", timestamp_ns=time.time_ns(),
+                        intent='greeting', needs_escalation=False)
+
+class TestConversationState:
+    """Test cases for ConversationState"""
+    
+    def test_history_keeps_latest_turns(self):
+        state = ConversationState()
+        for n in range(MAX_HISTORY_TURNS + 5):
+            state.history.append(entry(n))
+        
+        assert len(state.history) == MAX_HISTORY_TURNS
+        assert state.history[0].user == 'user 5'
+    
+    def test_instances_do_not_share_containers(self):
+        first, second = ConversationState(), ConversationState()
+        first.history.append(entry(0))
+        first.appointment_data['date'] = '2030-01-07'
+        
+        assert not second.history and not second.appointment_data
+    
+    def test_reset_appointment(self):
+        state = ConversationState(appointment_flow='booking', current_question='time',
+                                  waiting_for_confirmation=True, modifying_existing_appointment=True,
+                                  existing_appointment_id='APT-1', pending_appointment_selection=True,
+                                  available_appointments=[{}], confirmation_reprompt='Confirm?')
+        state.appointment_data['date'] = '2030-01-07'
+        state.history.append(entry(0))
+        
+        state.reset_appointment()
+        
+        assert state.appointment_flow is None and state.current_question is None
+        assert state.appointment_data == {}
+        assert not state.waiting_for_confirmation and not state.modifying_existing_appointment
+        assert state.existing_appointment_id is None and state.available_appointments is None
+        assert not state.pending_appointment_selection and state.confirmation_reprompt is None
+        assert len(state.history) == 1
+    
+    def test_history_entry_to_dict(self):
+        data = entry(1).to_dict()
+        
+        assert data['user'] == 'user 1' and data['intent'] == 'greeting'
+        assert isinstance(datetime.fromisoformat(data['timestamp']), datetime)
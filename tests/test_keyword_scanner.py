@@ -0,0 +1,60 @@
+"""
+Test suite for the single-pass keyword scanner
+"""
+import sys
+import os
+import pytest
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+
+from app.utils.keyword_scanner import build_keyword_scanner, scan_keywords, first_keyword_match
+from app.chatbot.appointment_flow import _SERVICE_KEYWORDS, _FIELD_KEYWORDS
+
+# Overlapping keywords: prefixes of each other and across groups
+OVERLAP_KEYWORDS = (
+    ('short', ('serv',)),
+    ('long', ('service type', 'services')),
+    ('other', ('type', 'vice')),
+)
+
+MESSAGES = [
+    '',
+    'hello there',
+    'i need some help with an installation',
+    'can you show me a demo of the setup',
+    'change the service type please',
+    'services',
+    'my email and contact details',
+    'what day and hour works for the schedule',
+    'i want to learn and get advice',
+    'maintain the device',
+    'preservice checkup',
+]
+
+
+def loop_mask(groups, text):
+    """Bitmask the way the old any() loops saw it: one bit per group with a hit"""
+    return sum(1 << i for i, (_, keywords) in enumerate(groups) if any(k in text for k in keywords))
+
+def loop_first_match(groups, text):
+    """First group with a hit, as the old priority-ordered loops returned it"""
+    for name, keywords in groups:
+        if any(k in text for k in keywords):
+            return name
+    return None
+
+@pytest.mark.parametrize('groups', [_SERVICE_KEYWORDS, _FIELD_KEYWORDS, OVERLAP_KEYWORDS])
+@pytest.mark.parametrize('text', MESSAGES)
+def test_scan_matches_keyword_loops(groups, text):
+    scanner = build_keyword_scanner(groups)
+    
+    assert scan_keywords(scanner, text) == loop_mask(groups, text)
+    assert first_keyword_match(scanner, text) == loop_first_match(groups, text)
+
+def test_group_bits_follow_priority_order():
+    scanner = build_keyword_scanner(_SERVICE_KEYWORDS)
+    
+    assert scan_keywords(scanner, 'demo') == 1 << 5
+    assert scan_keywords(scanner, 'consult') == 1
@@ -0,0 +1,89 @@
+"""
+Test suite for SemanticCache
+"""
+import sys
+import os
+import pytest
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+
+from app.chatbot.semantic_cache import SemanticCache
+
+# Fixed embeddings: near-duplicate phrasings point the same way
+VECTORS = {
+    'what are your hours': [1.0, 0.0, 0.0],
+    'what are your hours?': [0.99, 0.01, 0.0],
+    'how much does it cost': [0.0, 1.0, 0.0],
+    'where are you located': [0.0, 0.0, 1.0],
+}
+
+
+def make_cache(capacity=8):
+    """Create a cache over the fixed embeddings"""
+    return SemanticCache(lambda text: VECTORS[text], capacity=capacity, max_distance=0.05)
+
+def answer(text):
+    """Compute callable returning a canned answer for text"""
+    return lambda: {'response': f"answer: {text}", 'needs_escalation': False}
+
+class TestSemanticCache:
+    """Test cases for SemanticCache"""
+    
+    def test_miss_then_hit(self):
+        cache = make_cache()
+        
+        first = cache.get_or_compute('what are your hours', answer('hours'))
+        second = cache.get_or_compute('what are your hours', answer('recomputed'))
+        
+        assert first['response'] == second['response'] == 'answer: hours'
+        assert (cache.hits, cache.misses) == (1, 1)
+    
+    def test_similar_query_hits(self):
+        cache = make_cache()
+        cache.get_or_compute('what are your hours', answer('hours'))
+        
+        result = cache.get_or_compute('what are your hours?', answer('recomputed'))
+        assert result['response'] == 'answer: hours'
+    
+    def test_distant_query_misses(self):
+        cache = make_cache()
+        cache.get_or_compute('what are your hours', answer('hours'))
+        
+        result = cache.get_or_compute('how much does it cost', answer('pricing'))
+        assert result['response'] == 'answer: pricing'
+        assert cache.misses == 2
+    
+    def test_hit_returns_copy(self):
+        cache = make_cache()
+        cache.get_or_compute('what are your hours', answer('hours'))
+        
+        cache.get_or_compute('what are your hours', answer('recomputed'))['response'] = 'mutated'
+        assert cache.get_or_compute('what are your hours', answer('recomputed'))['response'] == 'answer: hours'
+    
+    def test_escalations_not_cached(self):
+        cache = make_cache()
+        cache.get_or_compute('what are your hours', lambda: {'response': 'ticket', 'needs_escalation': True})
+        
+        result = cache.get_or_compute('what are your hours', answer('hours'))
+        assert result['response'] == 'answer: hours'
+    
+    def test_lru_eviction(self):
+        cache = make_cache(capacity=2)
+        cache.get_or_compute('what are your hours', answer('hours'))
+        cache.get_or_compute('how much does it cost', answer('pricing'))
+        # Touch hours so pricing becomes least recently used
+        cache.get_or_compute('what are your hours', answer('recomputed'))
+        
+        cache.get_or_compute('where are you located', answer('location'))
+        
+        assert cache.get_or_compute('what are your hours', answer('recomputed'))['response'] == 'answer: hours'
+        assert cache.get_or_compute('how much does it cost', answer('recomputed'))['response'] == 'answer: recomputed'
+    
+    def test_clear(self):
+        cache = make_cache()
+        cache.get_or_compute('what are your hours', answer('hours'))
+        cache.clear()
+        
+        assert cache.get_or_compute('what are your hours', answer('recomputed'))['response'] == 'answer: recomputed'